@@ -1,17 +1,26 @@
+import asyncio
 import json
+import os
 from typing import Annotated, Any
+from uuid import uuid4
 from dotenv import load_dotenv
 from IPython.display import Markdown, display
 
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.types import Command
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 from agents.retrieval_orchestrator_agent import (
     create_retrieval_orchestrator_agent,
     Context,
+    FastPathRetriever,
+    speculative_retrieval,
 )
 from agents.resoning_agent import create_reasoning_agent
+from checkpointing import create_reasoning_checkpointer
+from models import PendingReview
+from reviews import create_review
 from utils.file_io import read_markdown_file
 
 load_dotenv()
@@ -30,17 +39,134 @@ class MainState(MessagesState):
     ] = None
     rag_chain: Annotated[Any, "The RAG chain to use for retrieval"]
     pending_review: Annotated[
-        Any | None, "HITL review configs returned on interrupt"
+        Any | None,
+        "HITL request (action_requests, review_configs) returned on interrupt",
     ] = None
+    review_id: Annotated[
+        str | None, "Pending review persisted when reasoning needs human approval"
+    ] = None
+    orchestration_mode: Annotated[
+        str | None, "How retrieval is orchestrated: agent, fast or retrieval"
+    ] = None
+    sub_queries: Annotated[
+        list[str] | None, "Sub-queries from the fast path's decomposition call"
+    ] = None
+    speculative_hits: Annotated[
+        dict | None, "Question embedding and top-k hits fetched during decomposition"
+    ] = None
+    reasoning_thread_id: Annotated[
+        str | None, "Checkpoint thread of this request's reasoning agent run"
+    ] = None
+
 
+# "agent": the orchestrator agent delegates to decomposition and retrieval
+# subagents; "fast": one decomposition call, then retrieval in code;
+# "retrieval": like fast, but the reasoning agent reads the raw chunks instead
+# of one synthesized answer per sub-query
+ORCHESTRATION_MODES = ("agent", "fast", "retrieval")
+orchestration_mode = os.getenv("ORCHESTRATION_MODE", "agent")
+if orchestration_mode not in ORCHESTRATION_MODES:
+    raise ValueError(
+        f"ORCHESTRATION_MODE must be one of {', '.join(ORCHESTRATION_MODES)}"
+    )
 
 retrieval_orchestrator_agent = create_retrieval_orchestrator_agent()
-reasoning_agent = create_reasoning_agent()
+fast_path_retriever = FastPathRetriever()
+# Every request reasons on its own checkpoint thread; threads are deleted when
+# the answer is final, and evicted by size/LRU/TTL if a review never resumes
+reasoning_checkpointer = create_reasoning_checkpointer()
+reasoning_agent = create_reasoning_agent(reasoning_checkpointer)
 reasoning_prompt = read_markdown_file("../prompts/reasoning_prompt.md")
 
+# Tag on reasoning-agent runs so streamed tokens of the final answer can be told
+# apart from tokens of the orchestration LLM calls
+ANSWER_TAG = "final_answer"
+
 
-def invoke_retrieval_orchestration(state: MainState):
-    """Invoke the retrieval orchestrator agent to get context from RAG."""
+def _question(state: MainState) -> str | None:
+    return state.get("question") or (
+        state.get("messages", [])[-1].content if state.get("messages") else None
+    )
+
+
+def _uses_fast_path(state: MainState) -> bool:
+    return (state.get("orchestration_mode") or orchestration_mode) != "agent"
+
+
+async def decompose_query(state: MainState, config: RunnableConfig):
+    """Fast path: split the question into sub-queries (one LLM call)."""
+    if not _uses_fast_path(state) or not _question(state):
+        return {}
+    return {
+        "sub_queries": await fast_path_retriever.decompose(_question(state), config)
+    }
+
+
+async def retrieve_speculatively(state: MainState):
+    """Fast path: fetch the raw question's top-k chunks while decomposition runs."""
+    if not (_uses_fast_path(state) and speculative_retrieval):
+        return {}
+    if not _question(state) or not state.get("rag_chain"):
+        return {}
+    return {
+        "speculative_hits": await fast_path_retriever.speculate(
+            _question(state), state.get("rag_chain")
+        )
+    }
+
+
+async def run_retrieval(
+    question: str,
+    rag_chain,
+    mode: str | None = None,
+    config=None,
+    sub_queries: list[str] | None = None,
+    speculative: dict | None = None,
+) -> dict:
+    """Collect per-sub-query context for a question with the given orchestration mode.
+
+    For the fast path, `sub_queries` and `speculative` come from the graph's
+    parallel branches; when they are missing both are computed here,
+    concurrently.
+    """
+    mode = mode or orchestration_mode
+    if mode not in ORCHESTRATION_MODES:
+        raise ValueError(f"Unknown orchestration mode {mode!r}")
+
+    if mode != "agent" and sub_queries is None:
+        if speculative_retrieval and speculative is None:
+            sub_queries, speculative = await asyncio.gather(
+                fast_path_retriever.decompose(question, config),
+                fast_path_retriever.speculate(question, rag_chain),
+            )
+        else:
+            sub_queries = await fast_path_retriever.decompose(question, config)
+    if mode == "fast":
+        results = await fast_path_retriever.ainvoke(
+            question, rag_chain, config, sub_queries, speculative
+        )
+        return {"messages": [], "retrieval_results": results}
+    if mode == "retrieval":
+        results = await fast_path_retriever.aretrieve_chunks(
+            question, rag_chain, config, sub_queries, speculative
+        )
+        return {"messages": [], "retrieval_results": results}
+
+    result = await retrieval_orchestrator_agent.ainvoke(
+        {
+            "messages": [{"role": "user", "content": question}],
+        },
+        config,
+        context=Context(rag_chain=rag_chain),
+    )
+    return {
+        "messages": result["messages"],
+        "retrieval_results": result["structured_response"]["results"],
+    }
+
+
+async def invoke_retrieval_orchestration(state: MainState, config: RunnableConfig):
+    """Invoke the retrieval orchestration to get context from RAG."""
     # Get the user question from state or last message
     user_question = state.get("question") or (
         state.get("messages", [])[-1].content if state.get("messages") else None
@@ -53,22 +179,44 @@ def invoke_retrieval_orchestration(state: MainState):
     if not rag_chain:
         raise ValueError("No rag_chain found in state")
 
-    result = retrieval_orchestrator_agent.invoke(
-        {
-            "messages": [{"role": "user", "content": user_question}],
-        },
-        context=Context(rag_chain=rag_chain),
+    result = await run_retrieval(
+        user_question,
+        rag_chain,
+        state.get("orchestration_mode"),
+        config,
+        sub_queries=state.get("sub_queries"),
+        speculative=state.get("speculative_hits"),
     )
-    res_messages = result["messages"]
-    retrieval_results = result["structured_response"]["results"]
     return {
-        "messages": res_messages,
-        "retrieval_results": retrieval_results,
+        **result,
         "question": user_question,  # Ensure question is set in state
     }
 
 
-def invoke_reasoning(state: MainState):
+def format_retrieved_chunks(retrieval_results: list[dict]) -> str:
+    """Raw chunks as reasoning context: one passage per chunk, with the
+    sub-queries that retrieved it, best match first."""
+    passages = {}
+    for result in retrieval_results:
+        for chunk in result["chunks"]:
+            passage = passages.setdefault(
+                chunk["source_id"], {**chunk, "sub_queries": []}
+            )
+            passage["sub_queries"].append(result["sub_query"])
+            distances = [
+                distance
+                for distance in (passage["distance"], chunk["distance"])
+                if distance is not None
+            ]
+            passage["distance"] = min(distances, default=None)
+    ranked = sorted(
+        passages.values(),
+        key=lambda passage: (passage["distance"] is None, passage["distance"] or 0),
+    )
+    return json.dumps(ranked, indent=2)
+
+
+async def invoke_reasoning(state: MainState):
     """Invoke the reasoning agent with retrieval results."""
     # Get question and retrieval results from state
     user_question = state.get("question") or (
@@ -81,9 +229,14 @@ def invoke_reasoning(state: MainState):
     if not retrieval_results:
         raise ValueError("No retrieval results found in state")
 
+    if (state.get("orchestration_mode") or orchestration_mode) == "retrieval":
+        context = format_retrieved_chunks(retrieval_results)
+    else:
+        context = json.dumps(retrieval_results, indent=2)
+
     # Format the reasoning prompt with user question and context
     formatted_prompt = reasoning_prompt.format(
-        user_question=user_question, context=json.dumps(retrieval_results, indent=2)
+        user_question=user_question, context=context
     )
 
     # Create messages with system prompt and user question
@@ -92,75 +245,110 @@ def invoke_reasoning(state: MainState):
         HumanMessage(content=user_question),
     ]
 
-    cfg = {"configurable": {"thread_id": "reasoning-thread"}}
+    thread_id = f"reasoning-{uuid4()}"
+    cfg = {"configurable": {"thread_id": thread_id}, "tags": [ANSWER_TAG]}
 
-    result = reasoning_agent.invoke({"messages": messages}, config=cfg)
+    result = await reasoning_agent.ainvoke({"messages": messages}, config=cfg)
     res_messages = result["messages"]
 
-    # If the agent interrupted for HITL, store review configs; graph edges decide routing
+    # If the agent interrupted for HITL, keep its request; graph edges decide routing
     if "__interrupt__" in result:
-        review_configs = result["__interrupt__"][-1].value["review_configs"]
-        return {"messages": res_messages, "pending_review": review_configs}
-
-    # Extract final answer from structured response
-    final_answer = result.get("structured_response", {}).get("final_answer", "")
-    if not final_answer:
-        # Fallback: get from last message if structured response is missing
-        final_answer = res_messages[-1].content if res_messages else ""
+        return {
+            "messages": res_messages,
+            "pending_review": result["__interrupt__"][-1].value,
+            "reasoning_thread_id": thread_id,
+        }
+    reasoning_checkpointer.delete_thread(thread_id)
 
     return {
         "messages": res_messages,
-        "final_answer": final_answer,
+        "final_answer": _final_answer(result),
         "pending_review": None,
     }
 
 
-def human_review(state: MainState):
-    """Handle human review for web search approval."""
-    # Present state.pending_review to a human and collect decision.
-    # For now, auto-approve to demonstrate resume flow.
-    pending_review = state.get("pending_review")
-    print("Human review needed for web search approval.")
-    print(f"Pending review: {pending_review}")
+def _final_answer(result: dict) -> str:
+    # Extract final answer from structured response
+    final_answer = (result.get("structured_response") or {}).get("final_answer", "")
+    if not final_answer:
+        # Fallback: get from last message if structured response is missing
+        messages = result.get("messages") or []
+        final_answer = messages[-1].content if messages else ""
+    return final_answer
 
-    decision = {
-        "type": "approve"
-    }  # Auto-approve for demo; later will replace with user input
-    cfg = {"configurable": {"thread_id": "reasoning-thread"}}
 
-    resumed = reasoning_agent.invoke(
-        Command(resume={"decisions": [decision]}),
-        config=cfg,
+def pause_for_review(question: str, thread_id: str, request: dict) -> PendingReview:
+    """Move an interrupted reasoning thread from memory into a pending review."""
+    review = create_review(
+        question, thread_id, request, reasoning_checkpointer.export_thread(thread_id)
     )
+    reasoning_checkpointer.delete_thread(thread_id)
+    return review
 
-    res_messages = resumed["messages"]
 
-    # Extract final answer from structured response
-    final_answer = resumed.get("structured_response", {}).get("final_answer", "")
-    if not final_answer:
-        # Fallback: get from last message if structured response is missing
-        final_answer = res_messages[-1].content if res_messages else ""
+async def human_review(state: MainState):
+    """Persist the interrupted reasoning run for a human to decide on.
 
+    Nothing is held in memory while waiting: the request returns the review id
+    and POST /agent/reviews/{review_id}/decision resumes from the checkpoint.
+    """
+    review = await asyncio.to_thread(
+        pause_for_review,
+        state.get("question"),
+        state.get("reasoning_thread_id"),
+        state.get("pending_review"),
+    )
     # Graph-directed: only update; builder edge sends us to END
-    return {
-        "messages": res_messages,
-        "final_answer": final_answer,
-        "human_approval": True,
-        "pending_review": None,
-    }
+    return {"review_id": review.id}
+
+
+async def resume_review(review: PendingReview, decisions: list[dict]) -> dict:
+    """Resume a persisted reasoning run with the reviewer's decisions.
+
+    Returns {"final_answer": ...}, or {"review_id": ...} of a new review when
+    the run is interrupted again.
+    """
+    reasoning_checkpointer.import_thread(review.thread_id, review.checkpoint)
+    cfg = {"configurable": {"thread_id": review.thread_id}, "tags": [ANSWER_TAG]}
+    try:
+        resumed = await reasoning_agent.ainvoke(
+            Command(resume={"decisions": decisions}), config=cfg
+        )
+        if "__interrupt__" in resumed:
+            next_review = await asyncio.to_thread(
+                pause_for_review,
+                review.question,
+                review.thread_id,
+                resumed["__interrupt__"][-1].value,
+            )
+            return {"review_id": next_review.id}
+        return {"final_answer": _final_answer(resumed)}
+    finally:
+        reasoning_checkpointer.delete_thread(review.thread_id)
 
 
 def create_orchestration_graph():
-    """Create and return the compiled orchestration graph."""
+    """Create and return the compiled orchestration graph.
+
+    The nodes are coroutines, so run the graph with `ainvoke`/`astream`.
+    """
     builder = StateGraph(MainState)
 
     # Add nodes
+    builder.add_node("decompose_query", decompose_query)
+    builder.add_node("retrieve_speculatively", retrieve_speculatively)
     builder.add_node("invoke_retrieval_orchestration", invoke_retrieval_orchestration)
     builder.add_node("invoke_reasoning", invoke_reasoning)
     builder.add_node("human_review", human_review)
 
     # Add edges
-    builder.add_edge(START, "invoke_retrieval_orchestration")
+    # Decomposition and speculative retrieval run in parallel (both are no-ops
+    # in agent mode); retrieval orchestration waits for both
+    builder.add_edge(START, "decompose_query")
+    builder.add_edge(START, "retrieve_speculatively")
+    builder.add_edge(
+        ["decompose_query", "retrieve_speculatively"], "invoke_retrieval_orchestration"
+    )
     builder.add_edge("invoke_retrieval_orchestration", "invoke_reasoning")
 
     # Route based on presence of pending_review set by invoke_reasoning
@@ -187,3 +375,119 @@ def create_orchestration_graph():
 
 # Default instance for convenience
 graph = create_orchestration_graph()
+
+NODE_NAMES = (
+    "decompose_query",
+    "retrieve_speculatively",
+    "invoke_retrieval_orchestration",
+    "invoke_reasoning",
+    "human_review",
+)
+
+
+class _FinalAnswerTokens:
+    """Incrementally decode the `final_answer` value out of streamed JSON output.
+
+    The reasoning agent answers with structured output, so its tokens arrive as
+    fragments of `{"final_answer": "..."}`. Plain-text answers pass through.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = None
+        self.done = False
+
+    def feed(self, fragment: str) -> str:
+        self.buffer += fragment
+        if self.position is None:
+            stripped = self.buffer.lstrip()
+            if stripped and not stripped.startswith("{"):
+                self.done = True
+                self.position = len(self.buffer)
+                return self.buffer
+            key = self.buffer.find('"final_answer"')
+            if key == -1:
+                return ""
+            colon = self.buffer.find(":", key)
+            quote = self.buffer.find('"', colon + 1) if colon != -1 else -1
+            if quote == -1:
+                return ""
+            self.position = quote + 1
+        elif self.done and not self.buffer.lstrip().startswith("{"):
+            return fragment
+
+        decoded = []
+        while not self.done and self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if char == '"':
+                self.done = True
+                break
+            if char == "\\":
+                escape = self.buffer[self.position : self.position + 6]
+                if len(escape) < 2 or (escape[1] == "u" and len(escape) < 6):
+                    break  # Wait for the rest of the escape sequence
+                if escape[1] == "u":
+                    decoded.append(chr(int(escape[2:6], 16)))
+                    self.position += 6
+                else:
+                    decoded.append(json.loads(f'"{escape[:2]}"'))
+                    self.position += 2
+                continue
+            decoded.append(char)
+            self.position += 1
+        return "".join(decoded)
+
+
+async def stream_orchestration_events(state: MainState):
+    """Run the graph and yield progress events and final-answer tokens as dicts."""
+    answer_tokens = _FinalAnswerTokens()
+    final_answer = None
+
+    async for event in graph.astream_events(state, version="v2"):
+        kind = event["event"]
+        name = event.get("name")
+        node = event.get("metadata", {}).get("langgraph_node")
+
+        if kind == "on_chain_start" and name == node == "invoke_reasoning":
+            yield {"event": "reasoning_started"}
+        elif kind == "on_chain_end" and name == node and name in NODE_NAMES:
+            output = event["data"].get("output") or {}
+            if isinstance(output, dict) and output.get("final_answer"):
+                final_answer = output["final_answer"]
+            yield {"event": "node_completed", "data": {"node": name}}
+            if isinstance(output, dict) and output.get("review_id"):
+                # The run is parked; the answer comes from the decision endpoint
+                yield {
+                    "event": "review_required",
+                    "data": {"review_id": output["review_id"]},
+                }
+                return
+        elif kind == "on_tool_end" and name == "task":
+            tool_input = event["data"].get("input") or {}
+            if tool_input.get("subagent_type") == "query_decomposition_subagent":
+                yield {"event": "decomposition_completed"}
+        elif kind == "on_custom_event" and name == "decomposition_completed":
+            # Emitted by the fast path, which has no subagent tool calls
+            yield {"event": "decomposition_completed"}
+        elif kind == "on_custom_event" and name == "sub_query_retrieved":
+            yield {"event": "sub_query_retrieved", "data": event["data"]}
+        elif kind == "on_tool_end" and name == "retrieve_from_vectorstore":
+            output = event["data"].get("output")
+            answers = getattr(output, "content", output)
+            if isinstance(answers, str):
+                try:
+                    answers = json.loads(answers)
+                except ValueError:
+                    answers = {}
+            for sub_query in answers or {}:
+                yield {"event": "sub_query_retrieved", "data": {"sub_query": sub_query}}
+        elif kind == "on_chat_model_stream" and ANSWER_TAG in event.get("tags", []):
+            content = event["data"]["chunk"].content
+            token = answer_tokens.feed(content) if isinstance(content, str) else ""
+            if token:
+                yield {"event": "token", "data": {"token": token}}
+
+    yield {
+        "event": "final_answer",
+        "data": {"final_answer": final_answer or "No answer generated."},
+    }
@@ -46,8 +46,12 @@ def web_search(
     return results
 
 
-def create_reasoning_agent():
-    """Create reasoning agent without static system prompt (will be set dynamically)."""
+def create_reasoning_agent(checkpointer=None):
+    """Create reasoning agent without static system prompt (will be set dynamically).
+
+    Each request should run on its own thread id; `checkpointer` defaults to
+    an unbounded InMemorySaver.
+    """
     model = init_chat_model(model="gpt-4o-mini")
     tools = [web_search, can_perform_web_search]
 
@@ -64,7 +68,7 @@ def create_reasoning_agent():
             )
         ],
         response_format=FinalAnswer,
-        checkpointer=InMemorySaver(),
+        checkpointer=checkpointer or InMemorySaver(),
     )
 
     return agent
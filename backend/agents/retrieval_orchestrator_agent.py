@@ -1,13 +1,18 @@
+import os
 from typing_extensions import TypedDict
 from typing import List, Any, Annotated
 from dataclasses import dataclass
 
+import numpy as np
 from langchain.agents import create_agent
 from langchain.chat_models import init_chat_model
 from langchain.tools import tool, ToolRuntime
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.messages import HumanMessage, SystemMessage
 from deepagents.middleware.subagents import SubAgentMiddleware
 
 from utils.file_io import read_markdown_file
+from vectorstore import chunk_record
 
 
 @dataclass
@@ -28,30 +33,52 @@ class AggregatedContextList(TypedDict):
     ]
 
 
+class RetrievedChunks(TypedDict):
+    sub_query: Annotated[str, "The sub-query string"]
+    chunks: Annotated[
+        List[dict], "Top-k chunks with source_id, source, page, distance and content"
+    ]
+
+
+class SubQueries(TypedDict):
+    sub_queries: Annotated[List[str], "Refined retrieval queries, at most 3"]
+
+
+# The decomposition prompt caps sub-queries at 3; enforce it for the fast path
+MAX_SUB_QUERIES = 3
+
+# The fast path retrieves for the raw question while decomposition runs; a
+# sub-query whose embedding is this similar to the question's reuses its hits
+speculative_retrieval = os.getenv("SPECULATIVE_RETRIEVAL", "on") != "off"
+speculative_cover_similarity = float(os.getenv("SPECULATIVE_COVER_SIMILARITY", "0.9"))
+
+
 @tool
-def retrieve_from_vectorstore(
+async def retrieve_from_vectorstore(
     queries: Annotated[list[str], "The list of queries to retrieve answers for"],
     runtime: ToolRuntime[Context],
 ) -> dict:
     """Retrieve and generate answers from the vectorstore for a list of queries.
-    This function invokes the RAG chain for each query and returns aggregated results.
+    This function invokes the RAG chain for all queries as one batch and returns aggregated results.
     """
 
     rag_chain = runtime.context.rag_chain
 
-    resp_dict = {}
-    for query in queries:
-        resp_dict[query] = rag_chain.invoke({"input": query})
+    answers = await rag_chain.abatch([{"question": query} for query in queries])
 
-    return resp_dict
+    return dict(zip(queries, answers))
 
 
-def create_retrieval_orchestrator_agent():
+def load_query_decomposition_prompt() -> str:
     examples = read_markdown_file("../prompts/query_decomposition_examples.md")
     query_decomposition_prompt = read_markdown_file(
         "../prompts/query_decomposition_prompt.md"
     )
-    query_decomposition_prompt = query_decomposition_prompt.format(examples=examples)
+    return query_decomposition_prompt.format(examples=examples)
+
+
+def create_retrieval_orchestrator_agent():
+    query_decomposition_prompt = load_query_decomposition_prompt()
     query_decomposition_model = "gpt-4o-mini"
     query_decomposition_description = "Analyzes research queries and generates optimized, non-overlapping sub-queries for vector database retrieval."
 
@@ -95,3 +122,165 @@ def create_retrieval_orchestrator_agent():
         context_schema=Context,
     )
     return agent
+
+
+class FastPathRetriever:
+    """Deterministic alternative to the orchestrator agent.
+
+    One structured-output decomposition call, then all sub-queries are
+    retrieved and answered as one batch by the RAG chain; the results are
+    assembled in code instead of by further agent turns. `aretrieve_chunks`
+    stops after retrieval and returns the raw chunks, so the only generation
+    pass left is the reasoning agent's.
+
+    Both accept the sub-queries and a `speculate` result computed beforehand,
+    so the graph can run decomposition and speculative retrieval in parallel;
+    speculative hits no sub-query retrieved are added as one more entry for
+    the question itself.
+    """
+
+    def __init__(self):
+        self.system_prompt = load_query_decomposition_prompt()
+        self.decomposer = init_chat_model(
+            model="gpt-4o-mini", temperature=0
+        ).with_structured_output(SubQueries)
+
+    async def decompose(self, question: str, config=None) -> list[str]:
+        decomposition = await self.decomposer.ainvoke(
+            [SystemMessage(content=self.system_prompt), HumanMessage(content=question)],
+            config,
+        )
+        sub_queries = [query.strip() for query in decomposition["sub_queries"]]
+        # Drop blanks and duplicates; fall back to the question itself
+        sub_queries = list(dict.fromkeys(query for query in sub_queries if query))
+        sub_queries = sub_queries[:MAX_SUB_QUERIES] or [question]
+        await adispatch_custom_event(
+            "decomposition_completed", {"sub_queries": sub_queries}, config=config
+        )
+        return sub_queries
+
+    async def speculate(self, question: str, rag_chain) -> dict:
+        """Embed the raw question and fetch its top-k chunks."""
+        [embedding] = await rag_chain.aembed_queries([question])
+        [hits] = await rag_chain.asearch_many([question], [embedding])
+        return {"embedding": embedding, "hits": hits}
+
+    async def search(
+        self, sub_queries: list[str], rag_chain, speculative: dict | None = None
+    ) -> tuple[list[list[tuple]], list[bool]]:
+        """Hits per sub-query, and which of them were covered by `speculative`.
+
+        Covered sub-queries reuse the speculative hits instead of being searched.
+        """
+        if speculative is None:
+            hits = await rag_chain.asearch_many(sub_queries)
+            return hits, [False] * len(sub_queries)
+        embeddings = await rag_chain.aembed_queries(sub_queries)
+        covered = [
+            similarity >= speculative_cover_similarity
+            for similarity in cosine_similarities(embeddings, speculative["embedding"])
+        ]
+        pending = [i for i, is_covered in enumerate(covered) if not is_covered]
+        hits = [speculative["hits"] if is_covered else [] for is_covered in covered]
+        if pending:
+            searched = await rag_chain.asearch_many(
+                [sub_queries[i] for i in pending], [embeddings[i] for i in pending]
+            )
+            for i, sub_query_hits in zip(pending, searched):
+                hits[i] = sub_query_hits
+        return hits, covered
+
+    async def ainvoke(
+        self,
+        question: str,
+        rag_chain,
+        config=None,
+        sub_queries: list[str] | None = None,
+        speculative: dict | None = None,
+    ) -> List[AggregatedContext]:
+        if sub_queries is None:
+            sub_queries = await self.decompose(question, config)
+        hits, _ = await self.search(sub_queries, rag_chain, speculative)
+        # The question's own hits still add context; answer it from the new ones
+        extra = unseen_hits(hits, speculative)
+        queries = sub_queries + [question] if extra else sub_queries
+        rows = hits + [extra] if extra else hits
+        answered = await rag_chain.aanswer_many(
+            queries,
+            config,
+            contexts=[[doc for _, doc, _ in row] for row in rows],
+        )
+        results = []
+        for i, (query, (docs, answer)) in enumerate(zip(queries, answered)):
+            if i < len(sub_queries):
+                await adispatch_custom_event(
+                    "sub_query_retrieved", {"sub_query": query}, config=config
+                )
+            results.append(
+                AggregatedContext(
+                    sub_query=query,
+                    retrieved_context="\n\n".join(doc.page_content for doc in docs),
+                    citations=[citation(doc.metadata) for doc in docs],
+                    synthesized_answer=answer,
+                )
+            )
+        return results
+
+    async def aretrieve_chunks(
+        self,
+        question: str,
+        rag_chain,
+        config=None,
+        sub_queries: list[str] | None = None,
+        speculative: dict | None = None,
+    ) -> List[RetrievedChunks]:
+        if sub_queries is None:
+            sub_queries = await self.decompose(question, config)
+        hits, _ = await self.search(sub_queries, rag_chain, speculative)
+        for sub_query in sub_queries:
+            await adispatch_custom_event(
+                "sub_query_retrieved", {"sub_query": sub_query}, config=config
+            )
+        results = [
+            RetrievedChunks(
+                sub_query=sub_query, chunks=[chunk_record(*hit) for hit in row]
+            )
+            for sub_query, row in zip(sub_queries, hits)
+        ]
+        # The question's own hits still add context; keep only new chunks
+        extra = unseen_hits(hits, speculative)
+        if extra:
+            results.append(
+                RetrievedChunks(
+                    sub_query=question, chunks=[chunk_record(*hit) for hit in extra]
+                )
+            )
+        return results
+
+
+def unseen_hits(rows: list[list[tuple]], speculative: dict | None) -> list[tuple]:
+    """Speculative hits that none of the sub-queries retrieved."""
+    if speculative is None:
+        return []
+    seen = {hit[0] for row in rows for hit in row}
+    return [hit for hit in speculative["hits"] if hit[0] not in seen]
+
+
+def cosine_similarities(vectors: list[list[float]], target: list[float]) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    target = np.asarray(target, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(target)
+    return vectors @ target / np.maximum(norms, 1e-12)
+
+
+def citation(metadata: dict) -> str:
+    """Human-readable source of a chunk, e.g. "paper.pdf p. 3, chunk 12"."""
+    source = metadata.get("source")
+    parts = [
+        os.path.basename(source) if source else f"document {metadata.get('doc_id')}"
+    ]
+    if metadata.get("page") is not None:
+        parts.append(f"p. {metadata['page'] + 1}")
+    if metadata.get("chunk_index") is not None:
+        parts.append(f"chunk {metadata['chunk_index']}")
+    return ", ".join(parts)
@@ -0,0 +1,49 @@
+"""add ingestion job table
+
+Revision ID: 3b9f2c7d1e4a
+Revises: 04f751ef1854
+Create Date: 2026-10-18 10:12:31.418220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9f2c7d1e4a'
+down_revision: Union[str, Sequence[str], None] = '04f751ef1854'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ingestionjob',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=False),
+    sa.Column('file_path', sa.String(), nullable=False),
+    sa.Column('stage', sa.String(), nullable=False),
+    sa.Column('chunk_count', sa.Integer(), nullable=False),
+    sa.Column('chunks_embedded', sa.Integer(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['doc_id'], ['docs.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ingestionjob_stage'), 'ingestionjob', ['stage'], unique=False)
+    op.create_index(op.f('ix_ingestionjob_user_id'), 'ingestionjob', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ingestionjob_user_id'), table_name='ingestionjob')
+    op.drop_index(op.f('ix_ingestionjob_stage'), table_name='ingestionjob')
+    op.drop_table('ingestionjob')
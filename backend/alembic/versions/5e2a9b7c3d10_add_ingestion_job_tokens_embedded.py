@@ -0,0 +1,28 @@
+"""add ingestion job tokens embedded
+
+Revision ID: 5e2a9b7c3d10
+Revises: 8c41d0e5a7b2
+Create Date: 2026-10-18 13:24:10.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a9b7c3d10'
+down_revision: Union[str, Sequence[str], None] = '8c41d0e5a7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ingestionjob', sa.Column('tokens_embedded', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ingestionjob', 'tokens_embedded')
@@ -0,0 +1,28 @@
+"""add ingestion job content hash
+
+Revision ID: 8c41d0e5a7b2
+Revises: 3b9f2c7d1e4a
+Create Date: 2026-10-18 11:02:47.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d0e5a7b2'
+down_revision: Union[str, Sequence[str], None] = '3b9f2c7d1e4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ingestionjob', sa.Column('content_hash', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ingestionjob', 'content_hash')
@@ -0,0 +1,34 @@
+"""add ingestion job active doc index
+
+Revision ID: 9e4b7a1d6c25
+Revises: d5a1c8e4b372
+Create Date: 2026-10-18 23:41:09.584213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7a1d6c25'
+down_revision: Union[str, Sequence[str], None] = 'd5a1c8e4b372'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_ingestionjob_active_doc_id',
+        'ingestionjob',
+        ['doc_id'],
+        unique=True,
+        sqlite_where=sa.text("stage NOT IN ('completed', 'failed')"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ingestionjob_active_doc_id', table_name='ingestionjob')
@@ -0,0 +1,30 @@
+"""add ingestion job versions
+
+Revision ID: a7d3e9f1c2b6
+Revises: 5e2a9b7c3d10
+Create Date: 2026-10-18 14:05:31.227846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9f1c2b6'
+down_revision: Union[str, Sequence[str], None] = '5e2a9b7c3d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ingestionjob', sa.Column('kind', sa.String(), nullable=False, server_default='upload'))
+    op.add_column('ingestionjob', sa.Column('chunks_reused', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ingestionjob', 'chunks_reused')
+    op.drop_column('ingestionjob', 'kind')
@@ -0,0 +1,52 @@
+"""add pending review table
+
+Revision ID: b83e5d1c7f26
+Revises: f2a7c5e9b410
+Create Date: 2026-10-18 21:12:47.905318
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b83e5d1c7f26"
+down_revision: Union[str, Sequence[str], None] = "f2a7c5e9b410"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "pendingreview",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("question", sa.String(), nullable=False),
+        sa.Column("thread_id", sa.String(), nullable=False),
+        sa.Column("request", sa.JSON(), nullable=True),
+        sa.Column("checkpoint", sa.Text(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("final_answer", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("decided_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_pendingreview_status"), "pendingreview", ["status"], unique=False
+    )
+    op.create_index(
+        op.f("ix_pendingreview_expires_at"),
+        "pendingreview",
+        ["expires_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_pendingreview_expires_at"), table_name="pendingreview")
+    op.drop_index(op.f("ix_pendingreview_status"), table_name="pendingreview")
+    op.drop_table("pendingreview")
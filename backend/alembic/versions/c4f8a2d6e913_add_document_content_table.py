@@ -0,0 +1,45 @@
+"""add document content table
+
+Revision ID: c4f8a2d6e913
+Revises: a7d3e9f1c2b6
+Create Date: 2026-10-18 15:12:08.640193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8a2d6e913'
+down_revision: Union[str, Sequence[str], None] = 'a7d3e9f1c2b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('documentcontent',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('document_uuids', sa.JSON(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_documentcontent_content_hash'), 'documentcontent', ['content_hash'], unique=True)
+    # SQLite cannot add a foreign key in place, so the table is rebuilt
+    with op.batch_alter_table('docs') as batch_op:
+        batch_op.add_column(sa.Column('content_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_docs_content_id_documentcontent', 'documentcontent', ['content_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('docs') as batch_op:
+        batch_op.drop_constraint('fk_docs_content_id_documentcontent', type_='foreignkey')
+        batch_op.drop_column('content_id')
+    op.drop_index(op.f('ix_documentcontent_content_hash'), table_name='documentcontent')
+    op.drop_table('documentcontent')
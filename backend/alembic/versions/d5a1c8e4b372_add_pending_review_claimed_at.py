@@ -0,0 +1,28 @@
+"""add pending review claimed at
+
+Revision ID: d5a1c8e4b372
+Revises: b83e5d1c7f26
+Create Date: 2026-10-18 23:05:41.217904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a1c8e4b372'
+down_revision: Union[str, Sequence[str], None] = 'b83e5d1c7f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pendingreview', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pendingreview', 'claimed_at')
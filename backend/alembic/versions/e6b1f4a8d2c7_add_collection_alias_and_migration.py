@@ -0,0 +1,48 @@
+"""add collection alias and migration tables
+
+Revision ID: e6b1f4a8d2c7
+Revises: c4f8a2d6e913
+Create Date: 2026-10-18 16:40:52.113870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b1f4a8d2c7'
+down_revision: Union[str, Sequence[str], None] = 'c4f8a2d6e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('collectionalias',
+    sa.Column('alias', sa.String(), nullable=False),
+    sa.Column('collection_name', sa.String(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('alias')
+    )
+    op.create_table('collectionmigration',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('target', sa.String(), nullable=False),
+    sa.Column('embedding_model', sa.String(), nullable=False),
+    sa.Column('embedding_dimensions', sa.Integer(), nullable=True),
+    sa.Column('stage', sa.String(), nullable=False),
+    sa.Column('copied', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_collectionmigration_target'), 'collectionmigration', ['target'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_collectionmigration_target'), table_name='collectionmigration')
+    op.drop_table('collectionmigration')
+    op.drop_table('collectionalias')
@@ -0,0 +1,46 @@
+"""add vector shards
+
+Revision ID: f2a7c5e9b410
+Revises: e6b1f4a8d2c7
+Create Date: 2026-10-18 18:03:26.471925
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c5e9b410'
+down_revision: Union[str, Sequence[str], None] = 'e6b1f4a8d2c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('vectorshard',
+    sa.Column('collection_name', sa.String(), nullable=False),
+    sa.Column('base_collection', sa.String(), nullable=False),
+    sa.Column('shard_key', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('collection_name')
+    )
+    op.create_index(op.f('ix_vectorshard_base_collection'), 'vectorshard', ['base_collection'], unique=False)
+    # The same file may now be indexed once per shard
+    op.drop_index(op.f('ix_documentcontent_content_hash'), table_name='documentcontent')
+    with op.batch_alter_table('documentcontent') as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.String(), nullable=False, server_default=''))
+        batch_op.create_unique_constraint('uq_documentcontent_content_hash_shard', ['content_hash', 'shard'])
+    op.create_index(op.f('ix_documentcontent_content_hash'), 'documentcontent', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_documentcontent_content_hash'), table_name='documentcontent')
+    with op.batch_alter_table('documentcontent') as batch_op:
+        batch_op.drop_constraint('uq_documentcontent_content_hash_shard', type_='unique')
+        batch_op.drop_column('shard')
+    op.create_index(op.f('ix_documentcontent_content_hash'), 'documentcontent', ['content_hash'], unique=True)
+    op.drop_table('vectorshard')
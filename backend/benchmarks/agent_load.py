@@ -0,0 +1,57 @@
+"""Load test for /agent/execute: latency and throughput at increasing concurrency.
+
+Point it at a running backend and an uploaded document. Compare the output of
+the sync handler (one threadpool thread per in-flight question, ~40 max) with
+the async pipeline; the async one keeps throughput growing past that limit.
+Run from the backend directory:
+    uv run python -m benchmarks.agent_load --doc-id 1 --concurrency 10 40 80 160
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def execute(client: httpx.AsyncClient, question: str, doc_id: int):
+    start = time.perf_counter()
+    response = await client.post(
+        "/agent/execute", params={"user_question": question, "doc_id": doc_id}
+    )
+    return time.perf_counter() - start, response.status_code == 200
+
+
+async def run_level(url: str, question: str, doc_id: int, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(execute(client, question, doc_id) for _ in range(concurrency))
+        )
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    ok = sum(1 for _, success in results if success)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{concurrency:>11} | {ok:>3}/{concurrency:<4} | "
+        f"{statistics.median(latencies):>8.2f} {p95:>8.2f} | "
+        f"{ok / elapsed:>8.2f}"
+    )
+
+
+async def main(args):
+    print(f"{'concurrency':>11} | {'ok':>8} | {'p50 s':>8} {'p95 s':>8} | {'req/s':>8}")
+    for concurrency in args.concurrency:
+        await run_level(args.url, args.question, args.doc_id, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--doc-id", type=int, required=True)
+    parser.add_argument("--question", default="What problem does this paper address?")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 40, 80, 160])
+    asyncio.run(main(parser.parse_args()))
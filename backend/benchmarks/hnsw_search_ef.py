@@ -0,0 +1,101 @@
+"""Sweep HNSW search_ef for a collection profile: query latency vs. recall@k.
+
+For each search_ef, builds an in-memory Chroma collection with the profile's
+HNSW settings from the same random unit vectors (no OpenAI key or Chroma
+server needed), runs a fixed query set and compares the hits with an exact
+NumPy top-k. Run from the backend directory:
+    uv run python -m benchmarks.hnsw_search_ef --profile latency --size 50000
+"""
+
+import argparse
+import statistics
+import time
+from uuid import uuid4
+
+import chromadb
+import numpy as np
+
+from benchmarks.scoped_retrieval import random_unit_vectors
+from collection_profiles import COLLECTION_PROFILES, hnsw_configuration
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, space: str):
+    if space == "l2":
+        # |q - v|^2 = |q|^2 + |v|^2 - 2 q.v; |q|^2 does not change the order
+        scores = 2 * queries @ vectors.T - (vectors**2).sum(axis=1)
+    else:
+        scores = queries @ vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def build(client, profile: str, vectors: np.ndarray, ef: int):
+    configuration = hnsw_configuration(profile)
+    configuration["hnsw"]["ef_search"] = ef
+    collection = client.create_collection(
+        f"bench_{uuid4().hex}", configuration=configuration
+    )
+    batch = client.get_max_batch_size()
+    for offset in range(0, len(vectors), batch):
+        collection.add(
+            ids=[str(i) for i in range(offset, min(len(vectors), offset + batch))],
+            embeddings=vectors[offset : offset + batch],
+        )
+    return collection
+
+
+def run(profile: str, size: int, dim: int, queries: int, top_k: int, efs: list[int]):
+    rng = np.random.default_rng(0)
+    client = chromadb.EphemeralClient()
+    vectors = random_unit_vectors(rng, size, dim)
+    query_vectors = random_unit_vectors(rng, queries, dim)
+    space = COLLECTION_PROFILES[profile]["space"]
+    expected = exact_top_k(vectors, query_vectors, top_k, space)
+
+    print(
+        f"{profile}: {size} vectors, dim {dim}, top {top_k}\n"
+        f"{'search_ef':>9} | {'build s':>7} | {'p50 ms':>8} {'p99 ms':>8} | {'recall':>6}"
+    )
+    for ef in efs:
+        # A loaded index ignores later ef_search changes, so build one per value
+        start = time.perf_counter()
+        collection = build(client, profile, vectors, ef)
+        build_seconds = time.perf_counter() - start
+
+        latencies, recalls = [], []
+        for query, truth in zip(query_vectors, expected):
+            start = time.perf_counter()
+            results = collection.query(
+                query_embeddings=[query], n_results=top_k, include=[]
+            )
+            latencies.append(time.perf_counter() - start)
+            hits = {int(i) for i in results["ids"][0]}
+            recalls.append(len(truth & hits) / top_k)
+        client.delete_collection(collection.name)
+
+        print(
+            f"{ef:>9} | {build_seconds:>7.1f} | "
+            f"{statistics.median(latencies) * 1000:>8.2f} "
+            f"{percentile(latencies, 0.99) * 1000:>8.2f} | "
+            f"{statistics.mean(recalls):>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--profile", choices=list(COLLECTION_PROFILES), default="default"
+    )
+    parser.add_argument("--size", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--search-ef", type=int, nargs="+", default=[10, 20, 40, 80, 160, 320]
+    )
+    args = parser.parse_args()
+    run(args.profile, args.size, args.dim, args.queries, args.top_k, args.search_ef)
@@ -0,0 +1,99 @@
+"""Compare retrieval orchestration modes: LLM calls and latency per question.
+
+Runs only the retrieval step (not the reasoning agent) in-process against an
+uploaded document, once per mode and question, and counts every chat model
+call, including the RAG chain's per-sub-query answers. Needs OPENAI_API_KEY,
+the database and Chroma. Run from the backend directory:
+    uv run python -m benchmarks.orchestration_modes --doc-id 1 --runs 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+from sqlmodel import Session
+
+from agents.orchestration import ORCHESTRATION_MODES, run_retrieval
+from benchmarks.hnsw_search_ef import percentile
+from db import engine
+from dedupe import retrieval_scope
+from models import Docs
+from vectorstore import get_rag_chain_for_documents
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += 1
+
+
+async def measure(question: str, rag_chain, mode: str) -> tuple[float, int, int]:
+    counter = LLMCallCounter()
+
+    async def retrieve(question: str, config):
+        return await run_retrieval(question, rag_chain, mode, config)
+
+    # Run inside a runnable so the fast path's progress events have a parent run
+    start = time.perf_counter()
+    result = await RunnableLambda(retrieve).ainvoke(question, {"callbacks": [counter]})
+    return (
+        time.perf_counter() - start,
+        counter.calls,
+        len(result["retrieval_results"]),
+    )
+
+
+async def main(args):
+    with Session(engine) as session:
+        doc = session.get(Docs, args.doc_id)
+        if doc is None or not doc.document_uuids:
+            raise SystemExit(f"Document {args.doc_id} not found or not ingested")
+        rag_chain = get_rag_chain_for_documents(
+            doc.document_uuids,
+            doc_id=retrieval_scope(session, doc),
+            user_id=doc.user_id,
+        )
+
+    print(
+        f"{'mode':>6} | {'p50 s':>7} {'p95 s':>7} | "
+        f"{'LLM calls':>9} | {'sub-queries':>11}"
+    )
+    for mode in args.modes:
+        latencies, calls, sub_queries = [], [], []
+        for _ in range(args.runs):
+            for question in args.questions:
+                latency, llm_calls, results = await measure(question, rag_chain, mode)
+                latencies.append(latency)
+                calls.append(llm_calls)
+                sub_queries.append(results)
+        print(
+            f"{mode:>6} | {statistics.median(latencies):>7.2f} "
+            f"{percentile(latencies, 0.95):>7.2f} | "
+            f"{statistics.mean(calls):>9.1f} | {statistics.mean(sub_queries):>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--doc-id", type=int, required=True)
+    parser.add_argument(
+        "--questions",
+        nargs="+",
+        default=[
+            "What problem does this paper address?",
+            "Which methods are proposed and how are they evaluated?",
+        ],
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--modes", nargs="+", choices=ORCHESTRATION_MODES, default=ORCHESTRATION_MODES
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,109 @@
+"""Compare post-filtered vs. `where`-scoped retrieval as the collection grows.
+
+Uses an in-memory Chroma client and random unit vectors, so no OpenAI key or
+Chroma server is needed. Run from the backend directory:
+    uv run python -m benchmarks.scoped_retrieval
+"""
+
+import argparse
+import statistics
+import time
+from uuid import uuid4
+
+import chromadb
+import numpy as np
+
+
+def random_unit_vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def add_doc(collection, rng, doc_id: int, chunks: int, dim: int, batch: int = 5000):
+    ids = [str(uuid4()) for _ in range(chunks)]
+    vectors = random_unit_vectors(rng, chunks, dim)
+    for start in range(0, chunks, batch):
+        batch_ids = ids[start : start + batch]
+        collection.add(
+            ids=batch_ids,
+            embeddings=vectors[start : start + batch].tolist(),
+            documents=[
+                f"doc {doc_id} chunk {start + i}" for i in range(len(batch_ids))
+            ],
+            metadatas=[{"doc_id": doc_id}] * len(batch_ids),
+        )
+    return ids, vectors
+
+
+def exact_top_k(vectors: np.ndarray, ids: list[str], query: np.ndarray, k: int):
+    scores = vectors @ query
+    return {ids[i] for i in np.argsort(-scores)[:k]}
+
+
+def run(sizes: list[int], doc_chunks: int, queries: int, top_k: int, dim: int):
+    rng = np.random.default_rng(0)
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(
+        f"bench_{uuid4().hex}", metadata={"hnsw:space": "cosine"}
+    )
+
+    target_ids, target_vectors = add_doc(collection, rng, 0, doc_chunks, dim)
+    target_set = set(target_ids)
+    total = doc_chunks
+    next_doc_id = 1
+
+    print(
+        f"{'collection':>10} | {'post-filter p50 ms':>18} {'recall':>6} | "
+        f"{'where p50 ms':>12} {'recall':>6}"
+    )
+    for size in sizes:
+        while total < size:
+            chunks = min(doc_chunks, size - total)
+            add_doc(collection, rng, next_doc_id, chunks, dim)
+            total += chunks
+            next_doc_id += 1
+
+        query_vectors = random_unit_vectors(rng, queries, dim)
+        post_latencies, post_recall = [], []
+        where_latencies, where_recall = [], []
+        for query in query_vectors:
+            expected = exact_top_k(target_vectors, target_ids, query, top_k)
+
+            # Previous behaviour: query the whole collection, then drop foreign hits
+            start = time.perf_counter()
+            results = collection.query(
+                query_embeddings=[query.tolist()], n_results=top_k
+            )
+            hits = [i for i in results["ids"][0] if i in target_set]
+            post_latencies.append(time.perf_counter() - start)
+            post_recall.append(len(expected.intersection(hits)) / top_k)
+
+            start = time.perf_counter()
+            results = collection.query(
+                query_embeddings=[query.tolist()],
+                n_results=top_k,
+                where={"doc_id": 0},
+            )
+            hits = results["ids"][0]
+            where_latencies.append(time.perf_counter() - start)
+            where_recall.append(len(expected.intersection(hits)) / top_k)
+
+        print(
+            f"{total:>10} | {statistics.median(post_latencies) * 1000:>18.2f} "
+            f"{statistics.mean(post_recall):>6.2f} | "
+            f"{statistics.median(where_latencies) * 1000:>12.2f} "
+            f"{statistics.mean(where_recall):>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[200, 2_000, 10_000, 50_000]
+    )
+    parser.add_argument("--doc-chunks", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+    run(args.sizes, args.doc_chunks, args.queries, args.top_k, args.dim)
@@ -0,0 +1,224 @@
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+
+class _ThreadUsage:
+    def __init__(self):
+        self.bytes = 0
+        self.touched_at = time.monotonic()
+        self.blob_keys = set()
+        self.write_keys = set()
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """In-memory checkpointer that caps its threads and their serialized bytes.
+
+    Threads are evicted least recently used first once `max_threads` or
+    `max_bytes` is exceeded, and after `ttl_seconds` without access. The
+    thread being written is never evicted by its own write.
+    """
+
+    def __init__(self, max_threads: int, max_bytes: int, ttl_seconds: float):
+        super().__init__()
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._bytes = 0
+        self._threads: OrderedDict[str, _ThreadUsage] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._evict_expired()
+            if thread_id not in self._threads:
+                # Also keeps the base class from adding an empty entry for it
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            usage = self._touch(thread_id)
+            added = 0
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                usage.blob_keys.add(key)
+                added += len(self.blobs[key][1])
+            serialized, serialized_metadata, _ = self.storage[thread_id][checkpoint_ns][
+                checkpoint["id"]
+            ]
+            added += len(serialized[1]) + len(serialized_metadata[1])
+            self._grow(usage, added)
+            self._evict(keep=thread_id)
+            return saved
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+        with self._lock:
+            existing = set(self.writes.get(outer_key, {}))
+            super().put_writes(config, writes, task_id, task_path)
+            usage = self._touch(thread_id)
+            usage.write_keys.add(outer_key)
+            added = sum(
+                len(write[2][1])
+                for inner_key, write in self.writes.get(outer_key, {}).items()
+                if inner_key not in existing
+            )
+            self._grow(usage, added)
+            self._evict(keep=thread_id)
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            self._drop(thread_id)
+
+    def export_thread(self, thread_id: str) -> str:
+        """Serialize a thread's checkpoints, writes and channel values to JSON."""
+        with self._lock:
+            usage = self._threads.get(thread_id) or _ThreadUsage()
+            checkpoints = [
+                [ns, checkpoint_id, _dump(checkpoint), _dump(metadata), parent]
+                for ns, saved in self.storage.get(thread_id, {}).items()
+                for checkpoint_id, (checkpoint, metadata, parent) in saved.items()
+            ]
+            writes = [
+                [ns, checkpoint_id, task_id, idx, channel, _dump(value), task_path]
+                for (_, ns, checkpoint_id) in usage.write_keys
+                for (task_id, idx), (_, channel, value, task_path) in self.writes.get(
+                    (thread_id, ns, checkpoint_id), {}
+                ).items()
+            ]
+            # Blob keys are (thread id, checkpoint ns, channel, version)
+            blobs = [
+                [*key[1:], _dump(self.blobs[key])]
+                for key in usage.blob_keys
+                if key in self.blobs
+            ]
+        return json.dumps(
+            {"checkpoints": checkpoints, "writes": writes, "blobs": blobs}
+        )
+
+    def import_thread(self, thread_id: str, exported: str):
+        """Load a thread written by `export_thread`, replacing any in memory."""
+        data = json.loads(exported)
+        with self._lock:
+            self._drop(thread_id)
+            usage = self._touch(thread_id)
+            added = 0
+            for ns, checkpoint_id, checkpoint, metadata, parent in data["checkpoints"]:
+                checkpoint, metadata = _load(checkpoint), _load(metadata)
+                self.storage[thread_id][ns][checkpoint_id] = (
+                    checkpoint,
+                    metadata,
+                    parent,
+                )
+                added += len(checkpoint[1]) + len(metadata[1])
+            for ns, checkpoint_id, task_id, idx, channel, value, task_path in data[
+                "writes"
+            ]:
+                outer_key = (thread_id, ns, checkpoint_id)
+                value = _load(value)
+                self.writes[outer_key][(task_id, idx)] = (
+                    task_id,
+                    channel,
+                    value,
+                    task_path,
+                )
+                usage.write_keys.add(outer_key)
+                added += len(value[1])
+            for ns, channel, version, value in data["blobs"]:
+                key = (thread_id, ns, channel, version)
+                self.blobs[key] = _load(value)
+                usage.blob_keys.add(key)
+                added += len(self.blobs[key][1])
+            self._grow(usage, added)
+            self._evict(keep=thread_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "bytes": self._bytes,
+                "max_threads": self.max_threads,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+            }
+
+    def _touch(self, thread_id: str) -> _ThreadUsage:
+        usage = self._threads.get(thread_id)
+        if usage is None:
+            usage = self._threads[thread_id] = _ThreadUsage()
+        usage.touched_at = time.monotonic()
+        self._threads.move_to_end(thread_id)
+        return usage
+
+    def _grow(self, usage: _ThreadUsage, added: int):
+        usage.bytes += added
+        self._bytes += added
+
+    def _evict(self, keep: str):
+        self._evict_expired()
+        while (
+            len(self._threads) > self.max_threads or self._bytes > self.max_bytes
+        ) and len(self._threads) > 1:
+            oldest = next(iter(self._threads))
+            if oldest == keep:
+                # Only the thread being written is over the limit: let it finish
+                self._threads.move_to_end(keep)
+                oldest = next(iter(self._threads))
+                if oldest == keep:
+                    break
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _evict_expired(self):
+        expired_before = time.monotonic() - self.ttl_seconds
+        while self._threads:
+            thread_id, usage = next(iter(self._threads.items()))
+            if usage.touched_at > expired_before:
+                break
+            self._drop(thread_id)
+            self.evictions += 1
+
+    def _drop(self, thread_id: str):
+        usage = self._threads.pop(thread_id, None)
+        self.storage.pop(thread_id, None)
+        if usage is None:
+            return
+        for key in usage.write_keys:
+            self.writes.pop(key, None)
+        for key in usage.blob_keys:
+            self.blobs.pop(key, None)
+        self._bytes -= usage.bytes
+
+
+def _dump(typed: tuple[str, bytes]) -> list[str]:
+    return [typed[0], base64.b64encode(typed[1]).decode("ascii")]
+
+
+def _load(dumped: list[str]) -> tuple[str, bytes]:
+    return dumped[0], base64.b64decode(dumped[1])
+
+
+def create_reasoning_checkpointer() -> BoundedMemorySaver:
+    return BoundedMemorySaver(
+        max_threads=int(os.getenv("REASONING_CHECKPOINT_MAX_THREADS", "1000")),
+        max_bytes=int(os.getenv("REASONING_CHECKPOINT_MAX_BYTES", str(64 * 1024**2))),
+        ttl_seconds=float(os.getenv("REASONING_CHECKPOINT_TTL_SECONDS", "3600")),
+    )
@@ -0,0 +1,70 @@
+import os
+from functools import lru_cache
+
+import tiktoken
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from embedding_cache import text_hash
+
+chunk_size_tokens = int(os.getenv("CHUNK_SIZE_TOKENS", "512"))
+chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    # Same tokenizer as the agents' ingestion pipeline (agents/rag_ingest.py)
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def create_text_splitter(
+    chunk_size: int | None = None, chunk_overlap: int | None = None
+) -> RecursiveCharacterTextSplitter:
+    """Token-bounded splitter that prefers paragraph, then line, then word breaks."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size or chunk_size_tokens,
+        chunk_overlap=(
+            chunk_overlap if chunk_overlap is not None else chunk_overlap_tokens
+        ),
+        length_function=count_tokens,
+        separators=["\n\n", "\n", ". ", " ", ""],
+        add_start_index=True,
+    )
+
+
+def chunk_documents(
+    documents: list[Document],
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None,
+    first_chunk_index: int = 0,
+) -> list[Document]:
+    """Split loaded pages/files into token-bounded chunks.
+
+    Chunks keep their source metadata (including the PDF `page`) and gain
+    `start_index`/`end_index` character offsets within that page, a running
+    `chunk_index` (starting at `first_chunk_index`), their `token_count` and a
+    `content_hash` used to detect unchanged chunks when a new version arrives.
+    """
+    splitter = create_text_splitter(chunk_size, chunk_overlap)
+    chunks = [
+        chunk
+        for chunk in splitter.split_documents(documents)
+        if chunk.page_content.strip()
+    ]
+    for index, chunk in enumerate(chunks, start=first_chunk_index):
+        chunk.metadata["end_index"] = chunk.metadata["start_index"] + len(
+            chunk.page_content
+        )
+        chunk.metadata["chunk_index"] = index
+        stamp_content_metadata(chunk)
+    return chunks
+
+
+def stamp_content_metadata(chunk: Document):
+    """Set the metadata derived from the chunk's text; redo it whenever the text changes."""
+    chunk.metadata["token_count"] = count_tokens(chunk.page_content)
+    chunk.metadata["content_hash"] = text_hash(chunk.page_content)
@@ -0,0 +1,58 @@
+import os
+
+# HNSW settings for new collections. Chroma applies them when the index is
+# built (a later `modify` is stored but not picked up by a loaded index), so
+# changing a collection's profile means copying it: scripts.migrate_collection
+COLLECTION_PROFILES = {
+    # Chroma's defaults, which collections created before profiles existed use
+    "default": {
+        "space": "l2",
+        "max_neighbors": 16,
+        "ef_construction": 100,
+        "ef_search": 100,
+        "batch_size": 100,
+        "sync_threshold": 1000,
+    },
+    # Small graph and narrow search: lowest query latency
+    "latency": {
+        "space": "cosine",
+        "max_neighbors": 16,
+        "ef_construction": 100,
+        "ef_search": 40,
+        "batch_size": 500,
+        "sync_threshold": 5000,
+    },
+    "balanced": {
+        "space": "cosine",
+        "max_neighbors": 32,
+        "ef_construction": 200,
+        "ef_search": 100,
+        "batch_size": 200,
+        "sync_threshold": 2000,
+    },
+    # Dense graph and wide search: recall close to exact, slower inserts and queries
+    "recall": {
+        "space": "cosine",
+        "max_neighbors": 48,
+        "ef_construction": 400,
+        "ef_search": 256,
+        "batch_size": 100,
+        "sync_threshold": 1000,
+    },
+}
+
+collection_profile = os.getenv("COLLECTION_PROFILE", "default")
+
+
+def get_profile(name: str | None = None) -> dict:
+    name = name or collection_profile
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(
+            f"Unknown collection profile {name!r}; "
+            f"expected one of {', '.join(COLLECTION_PROFILES)}"
+        )
+    return COLLECTION_PROFILES[name]
+
+
+def hnsw_configuration(name: str | None = None) -> dict:
+    return {"hnsw": dict(get_profile(name))}
@@ -0,0 +1,103 @@
+import os
+
+from sqlmodel import Session, select
+
+from db import engine
+from ingestion import TERMINAL_STAGES
+from models import DocumentContent, Docs, IngestionJob
+from vectorstore import all_indexes, get_max_write_batch_size
+
+compaction_page_size = int(os.getenv("COMPACTION_PAGE_SIZE", "1000"))
+
+
+def referenced_chunk_ids(session: Session) -> set[str]:
+    referenced = set()
+    for document_uuids in session.exec(select(Docs.document_uuids)).all():
+        referenced.update(document_uuids or [])
+    for document_uuids in session.exec(select(DocumentContent.document_uuids)).all():
+        referenced.update(document_uuids or [])
+    return referenced
+
+
+def load_references() -> tuple[set[str], set[int]]:
+    """Chunk ids the database references, and doc_ids still being ingested."""
+    with Session(engine) as session:
+        # Jobs save their documents before they finish, so a job that finishes
+        # after this read has its chunks in the references read next
+        ingesting = set(
+            session.exec(
+                select(IngestionJob.doc_id).where(
+                    IngestionJob.stage.not_in(TERMINAL_STAGES)
+                )
+            ).all()
+        )
+        referenced = referenced_chunk_ids(session)
+    return referenced, ingesting
+
+
+def compact_orphans(dry_run: bool = True, page_size: int | None = None) -> dict:
+    """Delete vectors that no document references, in the serving collection
+    and every vector shard.
+
+    Collections are scanned and compacted a page at a time. References are
+    re-read before a page's orphans are deleted, so chunks written by a job
+    that finishes mid-scan are kept; chunks of documents still being
+    ingested are never touched.
+    """
+    report = {"scanned": 0, "orphans": 0, "deleted": 0, "collection_size": 0}
+    indexes = all_indexes()
+    for index in indexes:
+        stats = _compact_collection(index.collection, dry_run, page_size)
+        for name, value in stats.items():
+            report[name] += value
+    return {"dry_run": dry_run, "collections": len(indexes), **report}
+
+
+def _compact_collection(collection, dry_run: bool, page_size: int | None) -> dict:
+    page_size = page_size or compaction_page_size
+    batch_size = get_max_write_batch_size()
+    referenced, ingesting = load_references()
+    scanned = orphans = deleted = 0
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["metadatas"])
+        ids = page["ids"]
+        if not ids:
+            break
+        owners = [
+            (chunk_id, (metadata or {}).get("doc_id"))
+            for chunk_id, metadata in zip(ids, page["metadatas"])
+        ]
+        page_orphans = _orphans(owners, referenced, ingesting)
+        if page_orphans:
+            # The chunks may have been written and saved since the last read
+            referenced, ingesting = load_references()
+            page_orphans = _orphans(owners, referenced, ingesting)
+
+        scanned += len(ids)
+        orphans += len(page_orphans)
+        if not dry_run:
+            for start in range(0, len(page_orphans), batch_size):
+                batch = page_orphans[start : start + batch_size]
+                collection.delete(ids=batch)
+                deleted += len(batch)
+            # The rest of the collection moves back by the deleted ids
+            offset -= len(page_orphans)
+        offset += len(ids)
+
+    return {
+        "scanned": scanned,
+        "orphans": orphans,
+        "deleted": deleted,
+        "collection_size": collection.count(),
+    }
+
+
+def _orphans(
+    owners: list[tuple[str, int | None]], referenced: set[str], ingesting: set[int]
+) -> list[str]:
+    return [
+        chunk_id
+        for chunk_id, doc_id in owners
+        if chunk_id not in referenced and (doc_id is None or doc_id not in ingesting)
+    ]
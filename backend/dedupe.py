@@ -0,0 +1,127 @@
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models import DocumentContent, Docs
+from sharding import shard_key
+
+
+def find_content(
+    session: Session, content_hash: str, shard: str = ""
+) -> DocumentContent | None:
+    """Chunk set stored for these bytes in the given vector shard."""
+    return session.exec(
+        select(DocumentContent).where(
+            DocumentContent.content_hash == content_hash,
+            DocumentContent.shard == shard,
+        )
+    ).first()
+
+
+def link_duplicate(
+    session: Session, content_hash: str, title: str, user_id: int
+) -> Docs | None:
+    """Create a Docs row on the chunk set already stored for these exact bytes.
+
+    Returns None when the file has not been ingested before into the user's
+    vector shard. The caller commits.
+    """
+    content = find_content(session, content_hash, shard_key(user_id))
+    if content is None or not content.document_uuids:
+        return None
+    content.ref_count += 1
+    doc = Docs(
+        title=title,
+        user_id=user_id,
+        document_uuids=list(content.document_uuids),
+        content_id=content.id,
+    )
+    session.add(content)
+    session.add(doc)
+    return doc
+
+
+def register_content(session: Session, doc: Docs, content_hash: str | None):
+    """Index a freshly ingested document's chunks under the hash of its file.
+
+    If another upload of the same bytes registered first, even concurrently,
+    the document keeps its own chunks unshared. The caller commits.
+    """
+    shard = shard_key(doc.user_id)
+    if not content_hash or find_content(session, content_hash, shard) is not None:
+        return
+    content = DocumentContent(
+        content_hash=content_hash,
+        shard=shard,
+        doc_id=doc.id,
+        document_uuids=list(doc.document_uuids),
+    )
+    try:
+        # A concurrent job may insert the same hash between the check and here
+        with session.begin_nested():
+            session.add(content)
+    except IntegrityError:
+        return
+    doc.content_id = content.id
+    session.add(doc)
+
+
+def release_content(session: Session, doc: Docs) -> bool:
+    """Drop the document's reference to its chunk set.
+
+    Returns True when no other document uses the chunks any more, so the
+    caller may delete them. The caller commits.
+    """
+    if doc.content_id is None:
+        return True
+    content = session.get(DocumentContent, doc.content_id)
+    doc.content_id = None
+    session.add(doc)
+    if content is None:
+        return True
+    content.ref_count -= 1
+    if content.ref_count > 0:
+        session.add(content)
+        return False
+    session.delete(content)
+    return True
+
+
+def hand_off_content(session: Session, doc: Docs) -> Docs | None:
+    """Move a shared chunk set's retrieval scope from `doc` to another document using it.
+
+    Shared chunks are stamped with the doc_id of their first upload, and a new
+    version of that document is stamped with the same doc_id, so the other
+    documents' scoped queries would match its new chunks too. Returns the
+    document that now scopes the chunk set (the caller restamps the chunks
+    with its id), or None when `doc` is not the origin of shared chunks. The
+    caller commits.
+    """
+    if doc.content_id is None:
+        return None
+    content = session.get(DocumentContent, doc.content_id)
+    if content is None or content.ref_count <= 1 or content.doc_id != doc.id:
+        return None
+    heir = session.exec(
+        select(Docs).where(Docs.content_id == content.id, Docs.id != doc.id)
+    ).first()
+    if heir is None:
+        return None
+    content.doc_id = heir.id
+    session.add(content)
+    return heir
+
+
+def is_shared(session: Session, doc: Docs) -> bool:
+    if doc.content_id is None:
+        return False
+    content = session.get(DocumentContent, doc.content_id)
+    return content is not None and content.ref_count > 1
+
+
+def retrieval_scope(session: Session, doc: Docs) -> int:
+    """doc_id stamped on the document's chunks (the first upload of a shared file)."""
+    if doc.content_id is not None:
+        content = session.get(DocumentContent, doc.content_id)
+        if content is not None:
+            return content.doc_id
+    return doc.id
@@ -0,0 +1,155 @@
+import os
+import random
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+from langchain_core.documents import Document
+
+from chunking import count_tokens
+
+# OpenAI accepts up to 2048 inputs and 300k tokens per embeddings request
+embedding_batch_max_tokens = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+embedding_batch_max_items = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "512"))
+embedding_max_concurrency = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+embedding_max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+embedding_backoff_base = float(os.getenv("EMBEDDING_BACKOFF_BASE_SECONDS", "1"))
+embedding_backoff_max = float(os.getenv("EMBEDDING_BACKOFF_MAX_SECONDS", "60"))
+
+
+def document_tokens(document: Document) -> int:
+    token_count = document.metadata.get("token_count")
+    if token_count is None:
+        token_count = count_tokens(document.page_content)
+        document.metadata["token_count"] = token_count
+    return token_count
+
+
+def iter_token_batches(
+    documents: Iterable[Document],
+    max_tokens: int | None = None,
+    max_items: int | None = None,
+) -> Iterator[list[Document]]:
+    """Pack documents, in order, into batches bounded by token count and size."""
+    max_tokens = max_tokens or embedding_batch_max_tokens
+    max_items = max_items or embedding_batch_max_items
+    batch, batch_tokens = [], 0
+    for document in documents:
+        tokens = document_tokens(document)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(document)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(
+        error,
+        (
+            openai.RateLimitError,
+            openai.APIConnectionError,
+            openai.APITimeoutError,
+            openai.InternalServerError,
+        ),
+    ):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+def with_backoff(func: Callable, *args, **kwargs):
+    """Call `func`, retrying 429/5xx errors with full-jitter exponential backoff."""
+    for attempt in range(embedding_max_retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == embedding_max_retries or not is_retryable(e):
+                raise
+            delay = random.uniform(
+                0, min(embedding_backoff_max, embedding_backoff_base * 2**attempt)
+            )
+            # Respect the server's Retry-After when it asks for a longer wait
+            response = getattr(e, "response", None)
+            retry_after = (
+                response.headers.get("retry-after") if response is not None else None
+            )
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            time.sleep(delay)
+
+
+class ThroughputStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.chunks = 0
+        self.tokens = 0
+
+    def add(self, documents: list[Document]):
+        self.chunks += len(documents)
+        self.tokens += sum(document_tokens(document) for document in documents)
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.chunks / elapsed, 2) if elapsed else None,
+            "tokens_per_second": round(self.tokens / elapsed, 2) if elapsed else None,
+        }
+
+
+def write_in_batches(
+    write: Callable[[list[Document], list[list[float]], list[str]], None],
+    documents: list[Document],
+    vectors: list[list[float]],
+    ids: list[str],
+    max_batch_size: int,
+):
+    for start in range(0, len(documents), max_batch_size):
+        end = start + max_batch_size
+        write(documents[start:end], vectors[start:end], ids[start:end])
+
+
+def embed_and_write(
+    documents: list[Document],
+    ids: list[str],
+    embed: Callable[[list[str]], list[list[float]]],
+    write: Callable[[list[Document], list[list[float]], list[str]], None],
+    max_write_batch_size: int,
+) -> dict:
+    """Embed token-bounded batches concurrently, writing each as it finishes.
+
+    Returns throughput stats (chunks/sec and tokens/sec).
+    """
+    stats = ThroughputStats()
+
+    with ThreadPoolExecutor(max_workers=embedding_max_concurrency) as pool:
+        futures = {}
+        offset = 0
+        for batch in iter_token_batches(documents):
+            texts = [document.page_content for document in batch]
+            batch_ids = ids[offset : offset + len(batch)]
+            futures[pool.submit(with_backoff, embed, texts)] = (batch, batch_ids)
+            offset += len(batch)
+
+        try:
+            for future in as_completed(futures):
+                batch, batch_ids = futures[future]
+                write_in_batches(
+                    write, batch, future.result(), batch_ids, max_write_batch_size
+                )
+                stats.add(batch)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return stats.as_dict()
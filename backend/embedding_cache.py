@@ -0,0 +1,365 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normalize chunk text so trivially different copies share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent SQLite store of embedding vectors keyed by (model, dimensions, text hash).
+
+    Entries are evicted least-recently-used first once the stored vectors exceed
+    `max_bytes`. Several processes may share the file: the byte total lives in
+    a one-row table kept current by triggers, inside each write's transaction.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Take the write lock so the byte total is seeded before other writers
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, dimensions, text_hash)
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_access "
+            "ON embedding_cache (last_access)"
+        )
+        # Total of stored vector bytes, so writes need no full-table SUM
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                bytes INTEGER NOT NULL
+            )
+            """)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO embedding_cache_size (id, bytes) "
+            "SELECT 0, COALESCE(SUM(size), 0) FROM embedding_cache"
+        )
+        for trigger in (
+            "embedding_cache_size_insert AFTER INSERT ON embedding_cache BEGIN "
+            "UPDATE embedding_cache_size SET bytes = bytes + NEW.size; END",
+            "embedding_cache_size_update AFTER UPDATE OF size ON embedding_cache "
+            "BEGIN UPDATE embedding_cache_size "
+            "SET bytes = bytes + NEW.size - OLD.size; END",
+            "embedding_cache_size_delete AFTER DELETE ON embedding_cache BEGIN "
+            "UPDATE embedding_cache_size SET bytes = bytes - OLD.size; END",
+        ):
+            self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS {trigger}")
+        self._conn.commit()
+
+    def get_many(
+        self, model: str, dimensions: int, hashes: list[str]
+    ) -> dict[str, list[float]]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embedding_cache "
+                    f"WHERE model = ? AND dimensions = ? "
+                    f"AND text_hash IN ({placeholders})",
+                    [model, dimensions, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_access = ? "
+                    "WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(now, model, dimensions, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(
+        self, model: str, dimensions: int, entries: dict[str, list[float]]
+    ) -> None:
+        if not entries:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in entries.items():
+            blob = array("f", vector).tobytes()
+            rows.append((model, dimensions, key, blob, len(blob), now))
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE: REPLACE's implicit
+            # delete does not fire the size triggers
+            self._conn.executemany(
+                "INSERT INTO embedding_cache "
+                "(model, dimensions, text_hash, vector, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (model, dimensions, text_hash) DO UPDATE SET "
+                "vector = excluded.vector, size = excluded.size, "
+                "last_access = excluded.last_access",
+                rows,
+            )
+            # Still inside the write transaction, so the total includes every
+            # other process's committed writes and no one else can change it
+            self._evict()
+            self._conn.commit()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute(
+            "SELECT bytes FROM embedding_cache_size WHERE id = 0"
+        ).fetchone()[0]
+
+    def _evict(self) -> None:
+        overflow = self._total_bytes() - self.max_bytes
+        if overflow <= 0:
+            return
+        # Walk from the least recently used entry until enough bytes are freed
+        victims = []
+        for rowid, size in self._conn.execute(
+            "SELECT rowid, size FROM embedding_cache ORDER BY last_access"
+        ):
+            victims.append((rowid,))
+            overflow -= size
+            if overflow <= 0:
+                break
+        self._conn.executemany("DELETE FROM embedding_cache WHERE rowid = ?", victims)
+
+
+# Per-request counters, set by QueryEmbeddingCache.track()
+_request_stats: ContextVar[dict | None] = ContextVar(
+    "query_embedding_request_stats", default=None
+)
+
+
+class QueryEmbeddingCache:
+    """Bounded in-process LRU of query embeddings with a TTL.
+
+    An optional `EmbeddingCache` acts as a shared on-disk second tier, so
+    several workers can reuse each other's query embeddings.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600,
+        disk: EmbeddingCache | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model: str, dimensions: int, key: str) -> list[float] | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((model, dimensions, key))
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end((model, dimensions, key))
+                    self._record("hits")
+                    return vector
+                del self._entries[(model, dimensions, key)]
+
+        if self.disk is not None:
+            vector = self.disk.get_many(model, dimensions, [key]).get(key)
+            if vector is not None:
+                self._store(model, dimensions, key, vector)
+                with self._lock:
+                    self._record("disk_hits")
+                return vector
+
+        with self._lock:
+            self._record("misses")
+        return None
+
+    def put(self, model: str, dimensions: int, key: str, vector: list[float]):
+        self._store(model, dimensions, key, vector)
+        if self.disk is not None:
+            self.disk.put_many(model, dimensions, {key: vector})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
+
+    @contextmanager
+    def track(self):
+        """Collect hit/miss counts for the calls made inside this block."""
+        stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        token = _request_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            _request_stats.reset(token)
+
+    def _store(self, model: str, dimensions: int, key: str, vector: list[float]):
+        with self._lock:
+            self._entries[(model, dimensions, key)] = (
+                time.monotonic() + self.ttl_seconds,
+                vector,
+            )
+            self._entries.move_to_end((model, dimensions, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _record(self, counter: str):
+        setattr(self, counter, getattr(self, counter) + 1)
+        request_stats = _request_stats.get()
+        if request_stats is not None:
+            request_stats[counter] += 1
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only calls the underlying model for cache misses."""
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        cache: EmbeddingCache,
+        query_cache: QueryEmbeddingCache | None = None,
+    ):
+        self.underlying = underlying
+        self.cache = cache
+        self.query_cache = query_cache
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+        self.dimensions = getattr(underlying, "dimensions", None) or 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [text_hash(text) for text in texts]
+        cached = self.cache.get_many(self.model, self.dimensions, hashes)
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model, self.dimensions, fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        if self.query_cache is None:
+            return self.underlying.embed_query(text)
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embed several queries with at most one request for the cache misses."""
+        if self.query_cache is None:
+            return self.underlying.embed_documents(texts)
+
+        keys, vectors, missing = self._lookup_queries(texts)
+        if missing:
+            fresh = self.underlying.embed_documents(list(missing.values()))
+            self._store_queries(missing, fresh, vectors)
+        return [vectors[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        if self.query_cache is None:
+            return await self.underlying.aembed_query(text)
+        return (await self.aembed_queries([text]))[0]
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        if self.query_cache is None:
+            return await self.underlying.aembed_documents(texts)
+
+        # The disk tier is a blocking SQLite lookup; keep it off the event loop
+        if self.query_cache.disk is None:
+            keys, vectors, missing = self._lookup_queries(texts)
+        else:
+            keys, vectors, missing = await asyncio.to_thread(
+                self._lookup_queries, texts
+            )
+        if missing:
+            fresh = await self.underlying.aembed_documents(list(missing.values()))
+            if self.query_cache.disk is None:
+                self._store_queries(missing, fresh, vectors)
+            else:
+                await asyncio.to_thread(self._store_queries, missing, fresh, vectors)
+        return [vectors[key] for key in keys]
+
+    def _lookup_queries(self, texts: list[str]):
+        keys = [text_hash(text) for text in texts]
+        vectors = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self.query_cache.get(self.model, self.dimensions, key)
+            if vector is None:
+                missing[key] = text
+            else:
+                vectors[key] = vector
+        return keys, vectors, missing
+
+    def _store_queries(self, missing: dict, fresh: list[list[float]], vectors: dict):
+        for key, vector in zip(missing.keys(), fresh):
+            self.query_cache.put(self.model, self.dimensions, key, vector)
+            vectors[key] = vector
+
+
+def create_embedding_cache() -> EmbeddingCache:
+    path = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+    max_bytes = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(1024**3)))
+    return EmbeddingCache(path, max_bytes)
+
+
+def create_query_embedding_cache() -> QueryEmbeddingCache:
+    disk_path = os.getenv("QUERY_EMBEDDING_CACHE_PATH")
+    disk = None
+    if disk_path:
+        disk_max_bytes = int(
+            os.getenv("QUERY_EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024**2))
+        )
+        disk = EmbeddingCache(disk_path, disk_max_bytes)
+    return QueryEmbeddingCache(
+        max_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")),
+        ttl_seconds=float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600")),
+        disk=disk,
+    )
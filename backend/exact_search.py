@@ -0,0 +1,120 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Documents up to this many chunks are searched in-process instead of by Chroma
+exact_search_max_chunks = int(os.getenv("EXACT_SEARCH_MAX_CHUNKS", "256"))
+exact_search_cache_bytes = int(
+    os.getenv("EXACT_SEARCH_CACHE_BYTES", str(256 * 1024**2))
+)
+
+
+class ChunkMatrix:
+    """A document's chunks with their embeddings as one normalized float32 matrix."""
+
+    def __init__(self, ids: list[str], embeddings, documents: list[Document]):
+        self.ids = ids
+        self.documents = documents
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if matrix.size:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        self.matrix = matrix
+
+    @classmethod
+    def from_results(cls, results) -> "ChunkMatrix":
+        ids = list(results.get("ids") or [])
+        embeddings = results.get("embeddings")
+        if embeddings is None or not ids:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+        metadatas = results.get("metadatas") or [None] * len(ids)
+        documents = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(results["documents"], metadatas)
+        ]
+        return cls(ids, embeddings, documents)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def search(self, query_embeddings: list[list[float]], top_k: int):
+        """Exact cosine top-k for each query, best match first."""
+        return [
+            [doc for _, doc, _ in hits]
+            for hits in self.search_with_distances(query_embeddings, top_k)
+        ]
+
+    def search_with_distances(
+        self, query_embeddings: list[list[float]], top_k: int
+    ) -> list[list[tuple[str, Document, float]]]:
+        """Like `search`, as (chunk id, chunk, cosine distance) per hit."""
+        if not self.ids:
+            return [[] for _ in query_embeddings]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = queries @ self.matrix.T
+
+        k = min(top_k, len(self.ids))
+        # argpartition finds the top k in linear time; only those k are sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+        top = np.take_along_axis(top, order, axis=1)
+        return [
+            [(self.ids[i], self.documents[i], float(1 - row_scores[i])) for i in row]
+            for row, row_scores in zip(top, scores)
+        ]
+
+
+def chunk_set_key(ids: list[str], namespace: str = "") -> str:
+    # Namespaced by collection, whose vectors may come from another model
+    return hashlib.sha1("\n".join([namespace, *ids]).encode("utf-8")).hexdigest()
+
+
+class ChunkMatrixCache:
+    """LRU of loaded chunk matrices, bounded by the bytes of their embeddings."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, ChunkMatrix] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, ids: list[str], namespace: str = "") -> ChunkMatrix | None:
+        key = chunk_set_key(ids, namespace)
+        with self._lock:
+            chunk_matrix = self._entries.get(key)
+            if chunk_matrix is not None:
+                self._entries.move_to_end(key)
+            return chunk_matrix
+
+    def put(self, ids: list[str], chunk_matrix: ChunkMatrix, namespace: str = ""):
+        if chunk_matrix.nbytes > self.max_bytes:
+            return
+        key = chunk_set_key(ids, namespace)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = chunk_matrix
+            self._bytes += chunk_matrix.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, ids: list[str]):
+        """Drop every cached matrix containing any of the given chunk ids."""
+        ids = set(ids)
+        with self._lock:
+            for key, chunk_matrix in list(self._entries.items()):
+                if ids.intersection(chunk_matrix.ids):
+                    del self._entries[key]
+                    self._bytes -= chunk_matrix.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
@@ -0,0 +1,515 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections.abc import Iterator
+from datetime import datetime
+from functools import partial
+from uuid import NAMESPACE_URL, uuid4, uuid5
+
+from langchain_core.documents import Document
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from db import engine
+from dedupe import (
+    hand_off_content,
+    is_shared,
+    link_duplicate,
+    register_content,
+    release_content,
+)
+from embedding_batcher import (
+    document_tokens,
+    embedding_max_concurrency,
+    iter_token_batches,
+    with_backoff,
+    write_in_batches,
+)
+from models import Docs, IngestionJob
+from parsing import iter_document_chunks, pdf_parse_workers
+from vectorstore import (
+    backfill_document_metadata,
+    delete_documents,
+    get_chunk_hashes,
+    get_index,
+    get_max_write_batch_size,
+    invalidate_rag_chains,
+    update_chunk_metadata,
+    write_embedded_documents,
+)
+
+spool_dir = os.getenv("INGESTION_SPOOL_DIR", "uploads")
+parse_workers = int(os.getenv("INGESTION_PARSE_WORKERS", str(pdf_parse_workers)))
+job_workers = int(os.getenv("INGESTION_JOB_WORKERS", "4"))
+embed_batch_size = int(os.getenv("INGESTION_EMBED_BATCH_SIZE", "64"))
+# Batches buffered between pipeline stages; bounds memory per job
+pipeline_queue_depth = int(os.getenv("INGESTION_QUEUE_DEPTH", "2"))
+
+TERMINAL_STAGES = ("completed", "failed")
+
+# Parsing is CPU-bound and runs in worker processes; each job's embedding and
+# writes run on the job pool threads, which mostly wait on network I/O
+_parse_pool: ProcessPoolExecutor | None = None
+_job_pool: ThreadPoolExecutor | None = None
+
+
+def start_ingestion_workers():
+    global _parse_pool, _job_pool
+    os.makedirs(spool_dir, exist_ok=True)
+    _parse_pool = ProcessPoolExecutor(
+        max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+    _job_pool = ThreadPoolExecutor(
+        max_workers=job_workers, thread_name_prefix="ingestion"
+    )
+    resume_pending_jobs()
+
+
+def shutdown_ingestion_workers():
+    # Unfinished jobs stay in the job table and are resumed on the next start
+    if _job_pool is not None:
+        _job_pool.shutdown(wait=False, cancel_futures=True)
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def spool_path(file_name: str) -> str:
+    return os.path.join(spool_dir, f"{uuid4()}{os.path.splitext(file_name)[1]}")
+
+
+class DocumentBusyError(Exception):
+    """The document already has an ingestion job that has not finished."""
+
+
+def create_job(
+    user_id: int,
+    title: str,
+    file_name: str,
+    file_path: str,
+    content_hash: str | None = None,
+) -> str:
+    """Queue an upload of a new document."""
+    job = IngestionJob(
+        id=str(uuid4()),
+        user_id=user_id,
+        title=title,
+        file_name=file_name,
+        file_path=file_path,
+        content_hash=content_hash,
+    )
+    with Session(engine) as session:
+        session.add(job)
+        session.commit()
+        return job.id
+
+
+def create_version_job(
+    user_id: int,
+    doc_id: int,
+    title: str | None,
+    file_name: str,
+    file_path: str,
+    content_hash: str | None = None,
+) -> IngestionJob:
+    """Queue a new version of one of the user's documents; `title` defaults to its current one.
+
+    Raises LookupError if the document is missing or not the user's, and
+    DocumentBusyError if it already has a job in flight. The unique index on
+    unfinished jobs' doc_id makes that check hold for concurrent uploads too.
+    """
+    with Session(engine) as session:
+        doc = session.get(Docs, doc_id)
+        if doc is None or doc.user_id != user_id:
+            raise LookupError(f"Document {doc_id} not found")
+        job = IngestionJob(
+            id=str(uuid4()),
+            user_id=user_id,
+            title=title or doc.title,
+            file_name=file_name,
+            file_path=file_path,
+            content_hash=content_hash,
+            kind="version",
+            doc_id=doc_id,
+        )
+        session.add(job)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            pending = session.exec(
+                select(IngestionJob.id).where(
+                    IngestionJob.doc_id == doc_id,
+                    IngestionJob.stage.not_in(TERMINAL_STAGES),
+                )
+            ).first()
+            raise DocumentBusyError(
+                f"Document {doc_id} is already being ingested (job {pending})"
+            )
+        session.refresh(job)
+        return job
+
+
+def submit_job(job_id: str):
+    if _job_pool is None:
+        raise RuntimeError("Ingestion workers are not running")
+    _job_pool.submit(run_job, job_id)
+
+
+def resume_pending_jobs():
+    with Session(engine) as session:
+        pending = session.exec(
+            select(IngestionJob).where(IngestionJob.stage.not_in(TERMINAL_STAGES))
+        ).all()
+        job_ids = [job.id for job in pending]
+    for job_id in job_ids:
+        submit_job(job_id)
+
+
+def job_progress(job: IngestionJob) -> dict:
+    elapsed = None
+    chunks_per_second = None
+    tokens_per_second = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.now()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            chunks_per_second = round(job.chunks_embedded / elapsed, 2)
+            tokens_per_second = round(job.tokens_embedded / elapsed, 2)
+    return {
+        "job_id": job.id,
+        "title": job.title,
+        "stage": job.stage,
+        "chunk_count": job.chunk_count,
+        "chunks_embedded": job.chunks_embedded,
+        "tokens_embedded": job.tokens_embedded,
+        "chunks_reused": job.chunks_reused,
+        "chunks_per_second": chunks_per_second,
+        "tokens_per_second": tokens_per_second,
+        "elapsed_seconds": elapsed,
+        "document_id": job.doc_id,
+        "error": job.error,
+    }
+
+
+def _update_job(job_id: str, **fields):
+    with Session(engine) as session:
+        job = session.get(IngestionJob, job_id)
+        for name, value in fields.items():
+            setattr(job, name, value)
+        session.add(job)
+        session.commit()
+
+
+def run_job(job_id: str):
+    with Session(engine) as session:
+        job = session.get(IngestionJob, job_id)
+        if job is None or job.stage in TERMINAL_STAGES:
+            return
+        session.expunge(job)
+
+    is_version = job.kind == "version"
+    doc_id = job.doc_id
+    uuids = []  # Chunks written by this job, removed again if it fails
+    try:
+        if not os.path.exists(job.file_path):
+            raise FileNotFoundError("Uploaded file is no longer available")
+
+        stored = None
+        if is_version:
+            with Session(engine) as session:
+                doc = session.get(Docs, doc_id)
+                if doc is None:
+                    raise ValueError(f"Document {doc_id} no longer exists")
+                previous_uuids = list(doc.document_uuids or [])
+                shared = is_shared(session, doc)
+                heir = hand_off_content(session, doc) if shared else None
+                if heir is not None:
+                    heir_id, heir_user_id = heir.id, heir.user_id
+                    # Queries on the shared chunks may miss hits until the
+                    # restamp below finishes; new chunks are only written after it
+                    session.commit()
+            if heir is not None:
+                backfill_document_metadata(previous_uuids, heir_id, heir_user_id)
+                invalidate_rag_chains(ids=previous_uuids)
+            # Unchanged chunks keep their ids and embeddings, unless other
+            # documents use the same chunks (their vectors are then re-read
+            # from the embedding cache instead)
+            if not shared:
+                stored = {}
+                for chunk_id, chunk_hash in get_chunk_hashes(
+                    previous_uuids, job.user_id
+                ).items():
+                    stored.setdefault(chunk_hash, []).append(chunk_id)
+        elif doc_id is None and job.content_hash:
+            # A byte-identical file was ingested before: share its chunks
+            with Session(engine) as session:
+                doc = link_duplicate(session, job.content_hash, job.title, job.user_id)
+                if doc is not None:
+                    session.commit()
+                    now = datetime.now()
+                    _update_job(
+                        job_id,
+                        stage="completed",
+                        doc_id=doc.id,
+                        chunk_count=len(doc.document_uuids),
+                        chunks_reused=len(doc.document_uuids),
+                        started_at=now,
+                        finished_at=now,
+                    )
+                    return
+        if doc_id is None:
+            with Session(engine) as session:
+                doc = Docs(title=job.title, user_id=job.user_id, document_uuids=[])
+                session.add(doc)
+                session.commit()
+                doc_id = doc.id
+        _update_job(job_id, stage="ingesting", started_at=datetime.now(), doc_id=doc_id)
+
+        # Batches are embedded concurrently and may finish out of order
+        chunk_uuids = {}
+        kept = {}
+        chunk_count = 0
+        tokens_embedded = 0
+        for batch, batch_uuids in _run_pipeline(job, doc_id, stored, kept):
+            for chunk, chunk_uuid in zip(batch, batch_uuids):
+                chunk_uuids[chunk.metadata["chunk_index"]] = chunk_uuid
+            uuids.extend(batch_uuids)
+            chunk_count = max(chunk_count, batch[-1].metadata["chunk_index"] + 1)
+            tokens_embedded += sum(document_tokens(chunk) for chunk in batch)
+            _update_job(
+                job_id,
+                chunk_count=chunk_count,
+                chunks_embedded=len(uuids),
+                tokens_embedded=tokens_embedded,
+            )
+        if kept:
+            # Reused chunks may have moved, so refresh their position metadata
+            kept_indexes = sorted(kept)
+            update_chunk_metadata(
+                [kept[index][1] for index in kept_indexes],
+                [kept[index][0] for index in kept_indexes],
+                doc_id=doc_id,
+                user_id=job.user_id,
+            )
+            for index in kept_indexes:
+                chunk_uuids[index] = kept[index][0]
+            _update_job(
+                job_id,
+                chunk_count=max(chunk_count, kept_indexes[-1] + 1),
+                chunks_reused=len(kept),
+            )
+        document_uuids = [chunk_uuids[index] for index in sorted(chunk_uuids)]
+        if not document_uuids:
+            raise ValueError("No documents could be extracted from the uploaded files")
+
+        _update_job(job_id, stage="saving")
+        with Session(engine) as session:
+            doc = session.get(Docs, doc_id)
+            doc.title = job.title
+            doc.document_uuids = document_uuids
+            # Replaced chunks can only go once no other document shares them
+            released = release_content(session, doc) if is_version else False
+            register_content(session, doc, job.content_hash)
+            session.add(doc)
+            session.commit()
+        # The new chunk set is live; nothing below may roll it back
+        uuids = []
+
+        if is_version:
+            invalidate_rag_chains(ids=previous_uuids, doc_id=doc_id)
+            removed = list(set(previous_uuids) - set(document_uuids))
+            if removed and released:
+                try:
+                    delete_documents(removed, job.user_id)
+                except Exception as e:
+                    print(f"Failed to delete replaced chunks of document {doc_id}: {e}")
+
+        _update_job(job_id, stage="completed", finished_at=datetime.now())
+    except Exception as e:
+        _update_job(
+            job_id,
+            stage="failed",
+            error=str(e),
+            finished_at=datetime.now(),
+            # A failed version leaves the document on its previous chunks
+            doc_id=doc_id if is_version else None,
+        )
+        _discard_partial_upload(None if is_version else doc_id, uuids, job.user_id)
+    finally:
+        if os.path.exists(job.file_path):
+            os.unlink(job.file_path)
+
+
+def _run_pipeline(
+    job: IngestionJob,
+    doc_id: int,
+    stored: dict[str, list[str]] | None = None,
+    kept: dict[int, tuple[str, Document]] | None = None,
+):
+    """Overlap parsing, embedding and Chroma writes through bounded queues.
+
+    Chunks are packed into token-bounded batches and several batches are
+    embedded at once (EMBEDDING_MAX_CONCURRENCY), retrying rate limits and
+    server errors with backoff; the queue bounds keep at most a few batches in
+    memory. Yields each written batch with its chunk ids, in completion order.
+
+    With `stored` (content hash -> chunk ids of the previous version), chunks
+    whose text is already stored are not embedded; they are collected in `kept`
+    by chunk_index as (existing id, chunk) instead.
+    """
+    pipeline = _Pipeline()
+    to_embed = queue.Queue(maxsize=pipeline_queue_depth + embedding_max_concurrency)
+    to_write = queue.Queue(maxsize=pipeline_queue_depth)
+    max_write_batch_size = get_max_write_batch_size()
+    # Pinned for the whole job so its vectors all come from one model (and
+    # land in the owner's shard); a collection migration waits for running
+    # jobs before its last catch-up copy
+    index = get_index(job.user_id)
+
+    def parse():
+        # PDFs are extracted page-range by page-range across the parse pool
+        chunks = iter_document_chunks(job.file_path, job.file_name, _parse_pool)
+        if stored is not None:
+            chunks = _skip_unchanged(chunks, stored, kept)
+        for batch in iter_token_batches(chunks, max_items=embed_batch_size):
+            if not pipeline.put(to_embed, batch):
+                return
+
+    def embed():
+        while (batch := pipeline.get(to_embed)) is not _DONE:
+            vectors = with_backoff(
+                index.embeddings.embed_documents,
+                [chunk.page_content for chunk in batch],
+            )
+            if not pipeline.put(to_write, (batch, vectors)):
+                return
+
+    workers = [
+        pipeline.start(
+            parse,
+            to_embed,
+            name=f"ingestion-parse-{job.id}",
+            consumers=embedding_max_concurrency,
+        )
+    ]
+    workers += [
+        pipeline.start(embed, to_write, name=f"ingestion-embed-{job.id}-{i}")
+        for i in range(embedding_max_concurrency)
+    ]
+    try:
+        finished_embedders = 0
+        while finished_embedders < embedding_max_concurrency:
+            item = pipeline.get(to_write)
+            if item is _DONE:
+                if pipeline.stop.is_set():
+                    break
+                finished_embedders += 1
+                continue
+            batch, vectors = item
+            # Deterministic ids make a resumed job overwrite its own partial writes
+            batch_uuids = [
+                str(uuid5(NAMESPACE_URL, f"{job.id}/{chunk.metadata['chunk_index']}"))
+                for chunk in batch
+            ]
+            write_in_batches(
+                partial(
+                    write_embedded_documents,
+                    doc_id=doc_id,
+                    user_id=job.user_id,
+                    index=index,
+                ),
+                batch,
+                vectors,
+                batch_uuids,
+                max_write_batch_size,
+            )
+            yield batch, batch_uuids
+    except BaseException:
+        pipeline.stop.set()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+    pipeline.raise_errors()
+
+
+def _skip_unchanged(
+    chunks: Iterator[Document],
+    stored: dict[str, list[str]],
+    kept: dict[int, tuple[str, Document]],
+) -> Iterator[Document]:
+    for chunk in chunks:
+        chunk_ids = stored.get(chunk.metadata["content_hash"])
+        if chunk_ids:
+            kept[chunk.metadata["chunk_index"]] = (chunk_ids.pop(0), chunk)
+        else:
+            yield chunk
+
+
+_DONE = object()
+
+
+class _Pipeline:
+    """Stop flag and error collection shared by the threads of one pipeline."""
+
+    def __init__(self):
+        self.stop = threading.Event()
+        self.errors = []
+
+    def start(
+        self, target, outbox: queue.Queue, name: str, consumers: int = 1
+    ) -> threading.Thread:
+        def run():
+            try:
+                target()
+            except BaseException as e:
+                self.errors.append(e)
+                self.stop.set()
+            finally:
+                # One end marker per downstream thread
+                for _ in range(consumers):
+                    self.put(outbox, _DONE)
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def put(self, inbox: queue.Queue, item) -> bool:
+        # Blocks while the queue is full (backpressure) unless the pipeline stops
+        while not self.stop.is_set():
+            try:
+                inbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, outbox: queue.Queue):
+        while not self.stop.is_set():
+            try:
+                return outbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def raise_errors(self):
+        if self.errors:
+            raise self.errors[0]
+
+
+def _discard_partial_upload(
+    doc_id: int | None, uuids: list[str], user_id: int | None = None
+):
+    """Remove the vectors and placeholder Docs row of a failed job."""
+    try:
+        if uuids:
+            delete_documents(uuids, user_id)
+        if doc_id is not None:
+            with Session(engine) as session:
+                doc = session.get(Docs, doc_id)
+                if doc is not None and not doc.document_uuids:
+                    session.delete(doc)
+                    session.commit()
+    except Exception as e:
+        print(f"Failed to clean up after ingestion job: {e}")
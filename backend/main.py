@@ -8,6 +8,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from db import create_db_and_tables
+from ingestion import start_ingestion_workers, shutdown_ingestion_workers
 from routes.auth import router as auth_router
 from routes.documents import router as documents_router
 from routes.agent import router as agent_router
@@ -17,8 +18,10 @@ from routes.agent import router as agent_router
 async def lifespan(app: FastAPI):
     # Startup
     create_db_and_tables()
+    start_ingestion_workers()
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    shutdown_ingestion_workers()
 
 
 app = FastAPI(lifespan=lifespan)
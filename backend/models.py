@@ -1,5 +1,5 @@
 from sqlmodel import Field, SQLModel, Column
-from sqlalchemy import JSON
+from sqlalchemy import JSON, Index, Text, UniqueConstraint, text
 from datetime import datetime
 
 
@@ -8,10 +8,109 @@ class User(SQLModel, table=True):
     email: str = Field(index=True, unique=True)
     hashed_password: str
 
+
 class Docs(SQLModel, table=True):
     id: int | None = Field(default=None, index=True, primary_key=True)
     title: str
     created_at: datetime = Field(default_factory=datetime.now)
     user_id: int = Field(foreign_key="user.id")
-    document_uuids: list[str] = Field(sa_column=Column(JSON))  # Chroma document UUIDs stored as JSON
+    document_uuids: list[str] = Field(
+        sa_column=Column(JSON)
+    )  # Chroma document UUIDs stored as JSON
+    content_id: int | None = Field(default=None, foreign_key="documentcontent.id")
+
+
+class DocumentContent(SQLModel, table=True):
+    """Chunk set of an uploaded file, shared by every Docs row with the same bytes."""
+
+    __table_args__ = (UniqueConstraint("content_hash", "shard"),)
+    id: int | None = Field(default=None, primary_key=True)
+    content_hash: str = Field(index=True)  # SHA-256 of the uploaded bytes
+    shard: str = ""  # Vector shard holding the chunks ("" when unsharded)
+    doc_id: int  # doc_id stamped on the chunks, used to scope retrieval
+    document_uuids: list[str] = Field(sa_column=Column(JSON))
+    ref_count: int = 1
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
+class IngestionJob(SQLModel, table=True):
+    # At most one unfinished job per document, so versions cannot interleave
+    __table_args__ = (
+        Index(
+            "ix_ingestionjob_active_doc_id",
+            "doc_id",
+            unique=True,
+            sqlite_where=text("stage NOT IN ('completed', 'failed')"),
+        ),
+    )
+
+    id: str = Field(primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    title: str
+    file_name: str
+    file_path: str  # Spooled upload, removed once the job finishes
+    content_hash: str | None = None  # SHA-256 of the uploaded bytes
+    kind: str = (
+        "upload"  # "upload" creates a Docs row, "version" replaces doc_id's chunks
+    )
+    stage: str = Field(default="queued", index=True)
+    chunk_count: int = 0
+    chunks_embedded: int = 0
+    tokens_embedded: int = 0
+    chunks_reused: int = 0
+    doc_id: int | None = Field(default=None, foreign_key="docs.id")
+    error: str | None = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+class CollectionAlias(SQLModel, table=True):
+    """Name of the Chroma collection an alias (e.g. "citebase") currently serves from."""
 
+    alias: str = Field(primary_key=True)
+    collection_name: str
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class CollectionMigration(SQLModel, table=True):
+    """Progress of re-embedding one collection into another, for resuming."""
+
+    id: int | None = Field(default=None, primary_key=True)
+    source: str
+    target: str = Field(index=True)
+    embedding_model: str
+    embedding_dimensions: int | None = None
+    stage: str = "copying"  # copying -> copied -> switched
+    copied: int = 0  # Source chunks re-embedded so far, in collection order
+    created_at: datetime = Field(default_factory=datetime.now)
+    finished_at: datetime | None = None
+
+
+class VectorShard(SQLModel, table=True):
+    """Shard map: the Chroma collection created for one shard of a base collection."""
+
+    collection_name: str = Field(primary_key=True)
+    base_collection: str = Field(index=True)
+    shard_key: str  # "user-<id>" or "bucket-<n>"
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
+class PendingReview(SQLModel, table=True):
+    """A reasoning run paused for human approval, resumable from its checkpoint."""
+
+    id: str = Field(primary_key=True)
+    question: str
+    thread_id: str  # Reasoning checkpoint thread
+    request: dict = Field(sa_column=Column(JSON))  # action_requests and review_configs
+    checkpoint: str | None = Field(
+        default=None, sa_column=Column(Text)
+    )  # Cleared once decided or expired
+    status: str = Field(
+        default="pending", index=True
+    )  # pending -> resuming -> approved/rejected, or expired
+    final_answer: str | None = Field(default=None, sa_column=Column(Text))
+    created_at: datetime = Field(default_factory=datetime.now)
+    expires_at: datetime = Field(index=True)
+    claimed_at: datetime | None = None  # When a decision started resuming it
+    decided_at: datetime | None = None
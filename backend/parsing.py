@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Iterator
+from itertools import islice
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import TextLoader
+from docx import Document as DocxDocument
+from pypdf import PdfReader
+
+from chunking import chunk_documents
+
+pdf_pages_per_task = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+pdf_parse_workers = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 2)))
+
+
+def extract_pdf_pages(
+    file_path: str, file_name: str, start: int, end: int
+) -> list[Document]:
+    """Extract the text of pages [start, end) with PyPDFLoader-style metadata."""
+    reader = PdfReader(file_path)
+    total_pages = len(reader.pages)
+    documents = []
+    for page_number in range(start, min(end, total_pages)):
+        documents.append(
+            Document(
+                page_content=reader.pages[page_number].extract_text().strip(),
+                metadata={
+                    "source": file_name,
+                    "page": page_number,
+                    "page_label": reader.page_labels[page_number],
+                    "total_pages": total_pages,
+                },
+            )
+        )
+    return documents
+
+
+def chunk_pdf_pages(
+    file_path: str, file_name: str, start: int, end: int
+) -> list[Document]:
+    return chunk_documents(extract_pdf_pages(file_path, file_name, start, end))
+
+
+def _iter_pdf_ranges(
+    task, file_path: str, file_name: str, executor: Executor | None
+) -> Iterator[list[Document]]:
+    """Run `task` over page ranges in the process pool, yielding results in page order.
+
+    At most two ranges per worker are in flight, so a slow consumer does not
+    make parsed pages pile up in memory.
+    """
+    total_pages = len(PdfReader(file_path).pages)
+    ranges = [
+        (start, min(start + pdf_pages_per_task, total_pages))
+        for start in range(0, total_pages, pdf_pages_per_task)
+    ]
+
+    # Small files are not worth the round trip to another process
+    if len(ranges) <= 1:
+        for start, end in ranges:
+            yield task(file_path, file_name, start, end)
+        return
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(
+            max_workers=pdf_parse_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    max_in_flight = 2 * pdf_parse_workers
+    pending = deque()
+    try:
+        remaining = iter(ranges)
+        for start, end in islice(remaining, max_in_flight):
+            pending.append(executor.submit(task, file_path, file_name, start, end))
+        while pending:
+            result = pending.popleft().result()
+            next_range = next(remaining, None)
+            if next_range is not None:
+                pending.append(executor.submit(task, file_path, file_name, *next_range))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def iter_pdf_pages(
+    file_path: str, file_name: str, executor: Executor | None = None
+) -> Iterator[Document]:
+    """Yield PDF pages in order while later page ranges are still being extracted."""
+    for pages in _iter_pdf_ranges(extract_pdf_pages, file_path, file_name, executor):
+        yield from pages
+
+
+def load_document_from_file(file_path: str, file_name: str) -> list[Document]:
+    """Convert uploaded file to LangChain Document objects."""
+    file_ext = os.path.splitext(file_name)[1].lower()
+    documents = []
+
+    try:
+        if file_ext not in [".pdf", ".txt", ".docx", ".doc"]:
+            raise ValueError(f"Unsupported file type: {file_ext}")
+        if file_ext == ".pdf":
+            documents = list(iter_pdf_pages(file_path, file_name))
+        elif file_ext == ".txt":
+            loader = TextLoader(file_path)
+            documents = loader.load()
+        elif file_ext in [".docx", ".doc"]:
+            if file_ext == ".docx":
+                doc = DocxDocument(file_path)
+                text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            else:
+                # For .doc files, you might need python-docx or another library
+                # For now, we'll try to read as text
+                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                    text = f.read()
+
+            documents = [Document(page_content=text, metadata={"source": file_name})]
+
+        # Add file source to metadata for all documents
+        for doc in documents:
+            doc.metadata["source"] = file_name
+
+        return documents
+    except Exception as e:
+        raise Exception(f"Failed to load document {file_name}: {str(e)}")
+
+
+def parse_and_chunk(file_path: str, file_name: str) -> list[Document]:
+    """Load a file and split it into token-bounded chunks (runs in worker processes)."""
+    return chunk_documents(load_document_from_file(file_path, file_name))
+
+
+def iter_document_chunks(
+    file_path: str, file_name: str, executor: Executor | None = None
+) -> Iterator[Document]:
+    """Yield token-bounded chunks in document order as soon as their pages are parsed.
+
+    PDFs are extracted and chunked page-range by page-range in `executor`;
+    other files are loaded and chunked in one task.
+    """
+    if os.path.splitext(file_name)[1].lower() != ".pdf":
+        if executor is None:
+            yield from parse_and_chunk(file_path, file_name)
+        else:
+            yield from executor.submit(parse_and_chunk, file_path, file_name).result()
+        return
+
+    try:
+        chunk_index = 0
+        for chunks in _iter_pdf_ranges(chunk_pdf_pages, file_path, file_name, executor):
+            for chunk in chunks:
+                chunk.metadata["chunk_index"] = chunk_index
+                chunk_index += 1
+                yield chunk
+    except Exception as e:
+        raise Exception(f"Failed to load document {file_name}: {str(e)}")
@@ -0,0 +1,335 @@
+import os
+import re
+import time
+from datetime import datetime
+from functools import partial
+
+from langchain_core.documents import Document
+from sqlmodel import Session, select
+
+from db import engine
+from collection_profiles import get_profile
+from embedding_batcher import embed_and_write, write_in_batches
+from ingestion import TERMINAL_STAGES
+from models import CollectionMigration, Docs, IngestionJob
+from sharding import sharding_enabled, shard_key
+from vectorstore import (
+    VectorIndex,
+    collection_alias_refresh_seconds,
+    get_base_index,
+    get_index,
+    get_max_write_batch_size,
+    open_collection,
+    set_active_collection,
+    write_embedded_documents,
+)
+
+reembed_page_size = int(os.getenv("REEMBED_PAGE_SIZE", "500"))
+# How long a switch waits for ingestion jobs that still write to the old collection
+reembed_job_wait_seconds = float(os.getenv("REEMBED_JOB_WAIT_SECONDS", "3600"))
+
+
+def default_target_name(model: str, dimensions: int | None, profile: str) -> str:
+    name = f"citebase_{model}_{dimensions or 'full'}_{profile}"
+    return re.sub(r"[^a-zA-Z0-9_-]", "-", name)
+
+
+def _get_migration(source: str, target: str, model: str, dimensions: int | None):
+    with Session(engine) as session:
+        migration = session.exec(
+            select(CollectionMigration)
+            .where(
+                CollectionMigration.source == source,
+                CollectionMigration.target == target,
+                CollectionMigration.stage != "switched",
+            )
+            .order_by(CollectionMigration.id.desc())
+        ).first()
+        if migration is None:
+            migration = CollectionMigration(
+                source=source,
+                target=target,
+                embedding_model=model,
+                embedding_dimensions=dimensions,
+            )
+            session.add(migration)
+            session.commit()
+            session.refresh(migration)
+        session.expunge(migration)
+        return migration
+
+
+def _update_migration(migration_id: int, **fields):
+    with Session(engine) as session:
+        migration = session.get(CollectionMigration, migration_id)
+        for name, value in fields.items():
+            setattr(migration, name, value)
+        session.add(migration)
+        session.commit()
+
+
+def _all_ids(collection, page_size: int) -> set[str]:
+    ids, offset = set(), 0
+    while page := collection.get(limit=page_size, offset=offset, include=[])["ids"]:
+        ids.update(page)
+        offset += len(page)
+    return ids
+
+
+def _same_model(source: VectorIndex, target: VectorIndex) -> bool:
+    return (source.embedding_model, source.embedding_dimensions) == (
+        target.embedding_model,
+        target.embedding_dimensions,
+    )
+
+
+def _page_include(source: VectorIndex, target: VectorIndex) -> list[str]:
+    if _same_model(source, target):
+        return ["documents", "metadatas", "embeddings"]
+    return ["documents", "metadatas"]
+
+
+def _copy(source: VectorIndex, target: VectorIndex, page) -> dict:
+    """Write one page of source chunks to the target, re-embedding them only
+    when the target uses another model."""
+    documents = [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(page["documents"], page["metadatas"])
+    ]
+    if _same_model(source, target):
+        write_in_batches(
+            partial(write_embedded_documents, index=target),
+            documents,
+            page["embeddings"],
+            page["ids"],
+            get_max_write_batch_size(),
+        )
+        return {"chunks": len(documents), "tokens": 0}
+    return embed_and_write(
+        documents,
+        page["ids"],
+        embed=target.embeddings.embed_documents,
+        write=partial(write_embedded_documents, index=target),
+        max_write_batch_size=get_max_write_batch_size(),
+    )
+
+
+def reconcile(
+    source: VectorIndex,
+    target: VectorIndex,
+    page_size: int,
+    delete_extra: bool = True,
+) -> tuple[int, int]:
+    """Copy chunks written to the source since they were scanned and, with
+    `delete_extra`, drop target chunks that were deleted from the source."""
+    source_ids = _all_ids(source.collection, page_size)
+    target_ids = _all_ids(target.collection, page_size)
+
+    missing = list(source_ids - target_ids)
+    for start in range(0, len(missing), page_size):
+        page = source.collection.get(
+            ids=missing[start : start + page_size],
+            include=_page_include(source, target),
+        )
+        if page["ids"]:
+            _copy(source, target, page)
+
+    extra = list(target_ids - source_ids) if delete_extra else []
+    for start in range(0, len(extra), get_max_write_batch_size()):
+        target.collection.delete(ids=extra[start : start + get_max_write_batch_size()])
+    return len(missing), len(extra)
+
+
+def migrate_collection(
+    model: str | None = None,
+    dimensions: int | None = None,
+    profile: str | None = None,
+    target: str | None = None,
+    page_size: int | None = None,
+    switch: bool = True,
+) -> dict:
+    """Copy the serving collection into a new one with another embedding model
+    and/or HNSW profile, then switch the alias to it.
+
+    `model`, `dimensions` (when `model` is not given) and `profile` default to
+    the serving collection's. Vectors are
+    re-embedded only when the model or dimensions change. The source keeps
+    serving reads and writes throughout. Progress is stored per page, so
+    re-running the same command resumes where it stopped. Pages are read by
+    offset, so the copy is reconciled by id before the switch, and once more
+    after it (once ingestion jobs that started before it have finished) for
+    writes that still reached the source.
+    """
+    if sharding_enabled():
+        raise ValueError("Collection migration does not cover vector shards")
+    page_size = page_size or reembed_page_size
+    source = get_index()
+    if model is None:
+        model = source.embedding_model
+        dimensions = dimensions or source.embedding_dimensions
+    profile = profile or source.profile
+    get_profile(profile)
+    target = target or default_target_name(model, dimensions, profile)
+    if target == source.name:
+        raise ValueError(f"Collection {target} is already serving")
+
+    migration = _get_migration(source.name, target, model, dimensions)
+    target_index = VectorIndex(open_collection(target, model, dimensions, profile))
+    if (
+        target_index.embedding_model,
+        target_index.embedding_dimensions,
+        target_index.profile,
+    ) != (model, dimensions, profile):
+        raise ValueError(
+            f"Collection {target} already exists with {target_index.embedding_model}"
+            f"/{target_index.embedding_dimensions} ({target_index.profile})"
+        )
+
+    total = source.collection.count()
+    copied = migration.copied
+    chunks = tokens = 0
+    started = time.perf_counter()
+    if migration.stage == "copying":
+        while True:
+            page = source.collection.get(
+                limit=page_size,
+                offset=copied,
+                include=_page_include(source, target_index),
+            )
+            if not page["ids"]:
+                break
+            stats = _copy(source, target_index, page)
+            copied += len(page["ids"])
+            chunks += stats["chunks"]
+            tokens += stats["tokens"]
+            _update_migration(migration.id, copied=copied)
+            print(f"Copied {copied}/{total} chunks into {target}")
+
+        added, removed = reconcile(source, target_index, page_size)
+        print(f"Reconciled {target}: {added} chunks added, {removed} removed")
+        _update_migration(migration.id, stage="copied")
+
+    if switch:
+        set_active_collection(target)
+        # Give serving processes time to re-read the alias. Ingestion jobs pin
+        # their collection when they start, so jobs created before then may
+        # keep writing to the old one: wait for them, then copy what they wrote
+        time.sleep(collection_alias_refresh_seconds)
+        _wait_for_ingestion(datetime.now())
+        added, _ = reconcile(source, target_index, page_size, delete_extra=False)
+        print(f"Switched to {target}; copied {added} late writes")
+        _update_migration(migration.id, stage="switched", finished_at=datetime.now())
+
+    elapsed = time.perf_counter() - started
+    return {
+        "source": source.name,
+        "target": target,
+        "profile": profile,
+        "switched": switch,
+        "chunks": target_index.collection.count(),
+        "tokens_per_second": round(tokens / elapsed, 2) if elapsed else None,
+        "chunks_per_second": round(chunks / elapsed, 2) if elapsed else None,
+    }
+
+
+def _wait_for_ingestion(created_before: datetime):
+    """Block until every ingestion job created before `created_before` ends.
+
+    Raises TimeoutError after REEMBED_JOB_WAIT_SECONDS; the migration then
+    stays unswitched in its record, so re-running the command waits again and
+    copies the late writes.
+    """
+    deadline = time.monotonic() + reembed_job_wait_seconds
+    while True:
+        with Session(engine) as session:
+            pending = session.exec(
+                select(IngestionJob.id).where(
+                    IngestionJob.stage.not_in(TERMINAL_STAGES),
+                    IngestionJob.created_at < created_before,
+                )
+            ).all()
+        if not pending:
+            return
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"{len(pending)} ingestion job(s) started before the switch are "
+                "still running; re-run the same command once they finish"
+            )
+        print(f"Waiting for {len(pending)} ingestion job(s) started before the switch")
+        time.sleep(max(collection_alias_refresh_seconds, 1))
+
+
+def _present_ids(collection, ids: list[str], page_size: int) -> set[str]:
+    present = set()
+    for start in range(0, len(ids), page_size):
+        present.update(
+            collection.get(ids=ids[start : start + page_size], include=[])["ids"]
+        )
+    return present
+
+
+def split_collection(page_size: int | None = None, prune: bool = False) -> dict:
+    """Copy every document's chunks from the serving collection into the vector
+    shard of its owner (VECTOR_SHARDING must be set).
+
+    Embeddings are copied as they are. Chunks already in their shard are
+    skipped, so re-running resumes an interrupted split and picks up writes
+    that reached the serving collection in the meantime. With `prune`, chunks
+    are deleted from the serving collection once every shard that needs them
+    holds a copy.
+    """
+    if not sharding_enabled():
+        raise ValueError("Set VECTOR_SHARDING to user or bucket before splitting")
+    page_size = page_size or reembed_page_size
+    source = get_base_index()
+
+    # Chunk ids per shard, with one owner to open the shard for
+    shards: dict[str, tuple[int, set[str]]] = {}
+    with Session(engine) as session:
+        for user_id, document_uuids in session.exec(
+            select(Docs.user_id, Docs.document_uuids)
+        ).all():
+            _, ids = shards.setdefault(shard_key(user_id), (user_id, set()))
+            ids.update(document_uuids or [])
+
+    copied = 0
+    split_ids: dict[str, bool] = {}
+    for key, (user_id, ids) in shards.items():
+        target = get_index(user_id)
+        ids = sorted(ids)
+        present = _present_ids(target.collection, ids, page_size)
+        missing = [chunk_id for chunk_id in ids if chunk_id not in present]
+        for start in range(0, len(missing), page_size):
+            page = source.collection.get(
+                ids=missing[start : start + page_size],
+                include=_page_include(source, target),
+            )
+            if page["ids"]:
+                _copy(source, target, page)
+                copied += len(page["ids"])
+        print(f"Shard {key}: {len(ids)} chunks, {len(missing)} copied")
+
+        if prune:
+            present = _present_ids(target.collection, ids, page_size)
+            for chunk_id in ids:
+                split_ids[chunk_id] = split_ids.get(chunk_id, True) and (
+                    chunk_id in present
+                )
+
+    pruned = 0
+    if prune:
+        prunable = [chunk_id for chunk_id, done in split_ids.items() if done]
+        prunable = sorted(_present_ids(source.collection, prunable, page_size))
+        batch_size = get_max_write_batch_size()
+        for start in range(0, len(prunable), batch_size):
+            batch = prunable[start : start + batch_size]
+            source.collection.delete(ids=batch)
+            pruned += len(batch)
+
+    return {
+        "source": source.name,
+        "shards": len(shards),
+        "copied": copied,
+        "pruned": pruned,
+        "source_size": source.collection.count(),
+    }
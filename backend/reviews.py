@@ -0,0 +1,119 @@
+import os
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session
+
+from db import engine
+from models import PendingReview
+
+# Pending reviews not decided within this long expire and drop their checkpoint
+review_ttl_seconds = float(os.getenv("REVIEW_TTL_SECONDS", str(24 * 3600)))
+# A review still "resuming" after this long lost its process and may be claimed again
+review_resume_timeout_seconds = float(os.getenv("REVIEW_RESUME_TIMEOUT_SECONDS", "600"))
+
+
+def create_review(
+    question: str, thread_id: str, request: dict, checkpoint: str
+) -> PendingReview:
+    expire_reviews()
+    now = datetime.now()
+    review = PendingReview(
+        id=str(uuid4()),
+        question=question,
+        thread_id=thread_id,
+        request=request,
+        checkpoint=checkpoint,
+        created_at=now,
+        expires_at=now + timedelta(seconds=review_ttl_seconds),
+    )
+    with Session(engine) as session:
+        session.add(review)
+        session.commit()
+        session.refresh(review)
+        session.expunge(review)
+    return review
+
+
+def get_review(review_id: str) -> PendingReview | None:
+    expire_reviews()
+    with Session(engine) as session:
+        review = session.get(PendingReview, review_id)
+        if review is not None:
+            session.expunge(review)
+        return review
+
+
+def claim_review(review_id: str) -> PendingReview | None:
+    """Mark a pending, unexpired review as being resumed.
+
+    A review left "resuming" for REVIEW_RESUME_TIMEOUT_SECONDS (its process
+    died mid-resume) can be claimed again. Returns None if another request
+    claimed it first or it expired; only one decision can resume a review.
+    """
+    now = datetime.now()
+    with Session(engine) as session:
+        result = session.exec(
+            update(PendingReview)
+            .where(
+                PendingReview.id == review_id,
+                _claimable(now),
+                PendingReview.expires_at > now,
+            )
+            .values(status="resuming", claimed_at=now)
+        )
+        session.commit()
+        if result.rowcount != 1:
+            return None
+        review = session.get(PendingReview, review_id)
+        session.expunge(review)
+        return review
+
+
+def release_review(review_id: str):
+    """Return a claimed review to pending after its resume failed."""
+    _update_review(review_id, status="pending")
+
+
+def finish_review(review_id: str, status: str, final_answer: str | None = None):
+    _update_review(
+        review_id,
+        status=status,
+        final_answer=final_answer,
+        checkpoint=None,
+        decided_at=datetime.now(),
+    )
+
+
+def expire_reviews() -> int:
+    now = datetime.now()
+    with Session(engine) as session:
+        result = session.exec(
+            update(PendingReview)
+            .where(_claimable(now), PendingReview.expires_at <= now)
+            .values(status="expired", checkpoint=None)
+        )
+        session.commit()
+        return result.rowcount
+
+
+def _claimable(now: datetime):
+    """Pending reviews, and resuming ones whose claim has gone stale."""
+    stale_before = now - timedelta(seconds=review_resume_timeout_seconds)
+    return or_(
+        PendingReview.status == "pending",
+        and_(
+            PendingReview.status == "resuming",
+            PendingReview.claimed_at < stale_before,
+        ),
+    )
+
+
+def _update_review(review_id: str, **fields):
+    with Session(engine) as session:
+        review = session.get(PendingReview, review_id)
+        for name, value in fields.items():
+            setattr(review, name, value)
+        session.add(review)
+        session.commit()
@@ -1,33 +1,189 @@
+import json
+from typing import Literal
+
 from fastapi import APIRouter, HTTPException, Depends
-from agents.orchestration import graph, MainState
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlmodel import Session
+from agents.orchestration import (
+    graph,
+    MainState,
+    reasoning_checkpointer,
+    resume_review,
+    stream_orchestration_events,
+)
 
+from dedupe import retrieval_scope
 from models import Docs
 from dependencies import SessionDep
-from vectorstore import create_rag_chain_for_documents
+from reviews import claim_review, finish_review, get_review, release_review
+from vectorstore import (
+    DocumentRAGChain,
+    chunk_matrices,
+    get_rag_chain_for_documents,
+    query_embedding_cache,
+)
 
 router = APIRouter(prefix="/agent", tags=["agent"])
 
 
 @router.get("/status")
 def get_agent_status():
-    return {"status": "Agent route is working"}
+    return {
+        "status": "Agent route is working",
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "exact_search_cache": chunk_matrices.stats(),
+        "reasoning_checkpointer": reasoning_checkpointer.stats(),
+    }
 
 
 @router.post("/execute")
-def execute_agent_task(user_question: str, doc_id: int, db_session: SessionDep):
-    """Execute the agent task based on user question and document ID."""
+async def execute_agent_task(
+    user_question: str,
+    doc_id: int,
+    db_session: SessionDep,
+    mode: Literal["agent", "fast", "retrieval"] | None = None,
+):
+    """Execute the agent task based on user question and document ID.
+
+    `mode` picks the retrieval orchestration (default: ORCHESTRATION_MODE).
+    """
+    # Database lookups are blocking; keep them off the event loop
+    rag_chain = await run_in_threadpool(load_rag_chain, db_session, doc_id)
+    state = MainState(
+        question=user_question, rag_chain=rag_chain, orchestration_mode=mode
+    )
+    with query_embedding_cache.track() as cache_stats:
+        result = await graph.ainvoke(state)
+
+    if result.get("review_id"):
+        return {
+            **(await pending_review_response(result["review_id"])),
+            "query_embedding_cache": cache_stats,
+        }
+    final_answer = result.get("final_answer", "No answer generated.")
+    return {"final_answer": final_answer, "query_embedding_cache": cache_stats}
+
+
+async def pending_review_response(review_id: str) -> dict:
+    review = await run_in_threadpool(get_review, review_id)
+    return {
+        "status": "pending_review",
+        "review_id": review.id,
+        "expires_at": review.expires_at,
+        "action_requests": review.request.get("action_requests", []),
+    }
+
+
+class ReviewDecision(BaseModel):
+    type: Literal["approve", "reject"]
+    message: str | None = None
+
+
+@router.get("/reviews/{review_id}")
+def get_pending_review(review_id: str):
+    review = get_review(review_id)
+    if review is None:
+        raise HTTPException(status_code=404, detail=f"Review {review_id} not found")
+    return {
+        "review_id": review.id,
+        "question": review.question,
+        "status": review.status,
+        "action_requests": review.request.get("action_requests", []),
+        "created_at": review.created_at,
+        "expires_at": review.expires_at,
+        "decided_at": review.decided_at,
+        "final_answer": review.final_answer,
+    }
+
+
+@router.post("/reviews/{review_id}/decision")
+async def decide_review(review_id: str, decision: ReviewDecision):
+    """Approve or reject a pending review and resume the reasoning run from its checkpoint.
+
+    The decision applies to every action the run asked to have reviewed.
+    """
+    review = await run_in_threadpool(get_review, review_id)
+    if review is None:
+        raise HTTPException(status_code=404, detail=f"Review {review_id} not found")
+    if review.status == "expired":
+        raise HTTPException(status_code=410, detail=f"Review {review_id} expired")
+    if review.status in ("pending", "resuming"):
+        # A stale "resuming" claim (its process died) can be taken over
+        review = await run_in_threadpool(claim_review, review_id)
+    else:
+        review = None
+    if review is None:
+        raise HTTPException(
+            status_code=409, detail=f"Review {review_id} is not pending"
+        )
+
+    actions = review.request.get("action_requests") or [None]
+    decisions = [decision.model_dump(exclude_none=True)] * len(actions)
+    try:
+        outcome = await resume_review(review, decisions)
+    except Exception as e:
+        await run_in_threadpool(release_review, review_id)
+        return {"status": "error", "message": str(e)}
+
+    status = "approved" if decision.type == "approve" else "rejected"
+    await run_in_threadpool(
+        finish_review, review_id, status, outcome.get("final_answer")
+    )
+    if outcome.get("review_id"):
+        return await pending_review_response(outcome["review_id"])
+    return {"status": status, "final_answer": outcome["final_answer"]}
+
+
+def load_rag_chain(db_session: Session, doc_id: int) -> DocumentRAGChain:
+    """Warm RAG chain for an ingested document, scoped to its chunks."""
     doc = db_session.query(Docs).filter(Docs.id == doc_id).first()
     if not doc:
         raise HTTPException(
             status_code=404, detail=f"Document with id {doc_id} not found"
         )
+    if not doc.document_uuids:
+        raise HTTPException(
+            status_code=409, detail=f"Document with id {doc_id} is still being ingested"
+        )
 
-    doc_uuids = doc.document_uuids
+    # Reuse a warm RAG chain for the specific documents
+    return get_rag_chain_for_documents(
+        doc.document_uuids,
+        top_k=3,
+        doc_id=retrieval_scope(db_session, doc),
+        user_id=doc.user_id,
+    )
 
-    # Create RAG chain for the specific documents
-    rag_chain = create_rag_chain_for_documents(doc_uuids, top_k=3)
-    state = MainState(question=user_question, rag_chain=rag_chain)
-    result = graph.invoke(state)
 
-    final_answer = result.get("final_answer", "No answer generated.")
-    return {"final_answer": final_answer}
+def format_sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event.get('data', {}))}\n\n"
+
+
+@router.post("/execute/stream")
+async def stream_agent_task(
+    user_question: str,
+    doc_id: int,
+    db_session: SessionDep,
+    mode: Literal["agent", "fast", "retrieval"] | None = None,
+):
+    """Execute the agent task and stream progress and answer tokens as server-sent events."""
+    rag_chain = await run_in_threadpool(load_rag_chain, db_session, doc_id)
+    state = MainState(
+        question=user_question, rag_chain=rag_chain, orchestration_mode=mode
+    )
+
+    async def event_stream():
+        try:
+            async for event in stream_orchestration_events(state):
+                yield format_sse(event)
+        except Exception as e:
+            yield format_sse({"event": "error", "data": {"message": str(e)}})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so events reach the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,66 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from langchain_core.documents import Document
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from docx import Document as DocxDocument
-import tempfile
-import os
 
 from vectorstore import (
-    upload_documents as upload_to_vectorstore,
     get_documents as get_from_vectorstore,
     delete_documents as delete_from_vectorstore,
     update_documents as update_in_vectorstore,
+    invalidate_rag_chains,
 )
+from dedupe import release_content
 from dependencies import SessionDep, CurrentUser
-from models import Docs
+from ingestion import (
+    DocumentBusyError,
+    create_job,
+    create_version_job,
+    job_progress,
+    spool_path,
+    submit_job,
+)
+from models import Docs, IngestionJob
+from utils.uploads import discard_spool, spool_upload
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 
-def load_document_from_file(file_path: str, file_name: str) -> list[Document]:
-    """Convert uploaded file to LangChain Document objects."""
-    file_ext = os.path.splitext(file_name)[1].lower()
-    documents = []
-
-    try:
-        if file_ext not in [".pdf", ".txt", ".docx", ".doc"]:
-            raise ValueError(f"Unsupported file type: {file_ext}")
-        if file_ext == ".pdf":
-            loader = PyPDFLoader(file_path)
-            documents = loader.load()
-        elif file_ext == ".txt":
-            loader = TextLoader(file_path)
-            documents = loader.load()
-        elif file_ext in [".docx", ".doc"]:
-            if file_ext == ".docx":
-                doc = DocxDocument(file_path)
-                text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            else:
-                # For .doc files, you might need python-docx or another library
-                # For now, we'll try to read as text
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read()
-
-            documents = [Document(page_content=text, metadata={"source": file_name})]
-
-        # Add file source to metadata for all documents
-        for doc in documents:
-            doc.metadata["source"] = file_name
-
-        return documents
-    except Exception as e:
-        raise Exception(f"Failed to load document {file_name}: {str(e)}")
-
-
 @router.get("/status")
 def get_documents_status():
     return {"status": "Documents route is working"}
 
 
 @router.get("/get")
-def get_documents(ids: list[str]):
+def get_documents(ids: list[str], current_user: CurrentUser):
     try:
-        documents = get_from_vectorstore(ids)
+        documents = get_from_vectorstore(ids, current_user.id)
         docs = [doc.dict() for doc in documents]
         return {"status": "success", "documents": docs}
     except Exception as e:
@@ -78,69 +50,136 @@ def get_docs_from_db(db_session: SessionDep, current_user: CurrentUser):
 
 @router.post("/upload")
 async def upload_document(
-    db_session: SessionDep,
     current_user: CurrentUser,
     title: str = Form(...),
     file: UploadFile = File(...),
 ):
     try:
-        documents = []
+        # Stream the upload to disk; parsing and embedding run in the background
+        file_path = spool_path(file.filename)
+        size, content_hash = await spool_upload(file, file_path)
+
+        try:
+            # The job insert is a blocking database write
+            job_id = await run_in_threadpool(
+                create_job,
+                current_user.id,
+                title,
+                file.filename,
+                file_path,
+                content_hash,
+            )
+        except BaseException:
+            # Without a job nothing would remove the spooled file
+            discard_spool(file_path)
+            raise
+        submit_job(job_id)
 
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=os.path.splitext(file.filename)[1]
-        ) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file.flush()
-            tmp_path = tmp_file.name
+        return {
+            "job_id": job_id,
+            "title": title,
+            "stage": "queued",
+            "size": size,
+            "content_hash": content_hash,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@router.post("/{doc_id}/versions")
+async def upload_document_version(
+    doc_id: int,
+    current_user: CurrentUser,
+    title: str | None = Form(None),
+    file: UploadFile = File(...),
+):
+    """Replace a document's content; only chunks whose text changed are re-embedded."""
+    try:
+        file_path = spool_path(file.filename)
+        size, content_hash = await spool_upload(file, file_path)
 
         try:
-            # Convert file to LangChain Documents
-            documents = load_document_from_file(tmp_path, file.filename)
-        finally:
-            # Clean up temporary file
-            os.unlink(tmp_path)
-
-        if not documents:
-            return {
-                "status": "error",
-                "message": "No documents could be extracted from the uploaded files",
-            }
-
-        # Upload documents to vector store
-        uuids = upload_to_vectorstore(documents)
-
-        # Save document metadata to db
-        doc = Docs(title=title, user_id=current_user.id, document_uuids=uuids)
-        db_session.add(doc)
-        db_session.commit()
-        db_session.refresh(doc)
+            # Ownership, the in-flight check and the insert share one transaction
+            job = await run_in_threadpool(
+                create_version_job,
+                current_user.id,
+                doc_id,
+                title,
+                file.filename,
+                file_path,
+                content_hash,
+            )
+        except BaseException:
+            discard_spool(file_path)
+            raise
+        submit_job(job.id)
 
         return {
-            "document_id": doc.id,
-            "title": doc.title,
-            "chunk_ids": uuids,
-            "chunk_count": len(documents),
+            "job_id": job.id,
+            "document_id": doc_id,
+            "title": job.title,
+            "stage": "queued",
+            "size": size,
+            "content_hash": content_hash,
         }
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    except DocumentBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
-        db_session.rollback()
         return {"status": "error", "message": str(e)}
 
 
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(job_id: str, db_session: SessionDep, current_user: CurrentUser):
+    job = db_session.get(IngestionJob, job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_progress(job)
+
+
 @router.delete("/delete")
-def delete_documents(ids: list[str]):
+def delete_documents(ids: list[str], current_user: CurrentUser):
     try:
-        delete_from_vectorstore(ids)
+        delete_from_vectorstore(ids, current_user.id)
+        invalidate_rag_chains(ids=ids)
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+@router.delete("/{doc_id}")
+def delete_document(doc_id: int, db_session: SessionDep, current_user: CurrentUser):
+    """Delete a document; its chunks are removed once no other document shares them."""
+    doc = db_session.get(Docs, doc_id)
+    if not doc or doc.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+
+    try:
+        ids = list(doc.document_uuids or [])
+        released = release_content(db_session, doc)
+        db_session.delete(doc)
+        db_session.commit()
+
+        if released and ids:
+            delete_from_vectorstore(ids, doc.user_id)
+        invalidate_rag_chains(ids=ids, doc_id=doc_id)
+        return {"status": "success", "chunks_deleted": len(ids) if released else 0}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
 @router.put("/update")
-def update_documents(documents: list[Document], ids: list[str]):
+def update_documents(
+    documents: list[Document], ids: list[str], current_user: CurrentUser
+):
     try:
-        update_in_vectorstore(documents, ids)
+        update_in_vectorstore(documents, ids, current_user.id)
+        invalidate_rag_chains(ids=ids)
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
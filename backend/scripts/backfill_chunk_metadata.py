@@ -0,0 +1,28 @@
+"""Stamp doc_id/user_id into the metadata of chunks uploaded before scoped retrieval.
+
+Run from the backend directory:
+    uv run python -m scripts.backfill_chunk_metadata
+"""
+
+from sqlmodel import Session, select
+
+from db import engine
+from models import Docs
+from vectorstore import backfill_document_metadata
+
+
+def backfill_chunk_metadata() -> int:
+    updated = 0
+    with Session(engine) as session:
+        for doc in session.exec(select(Docs)).all():
+            count = backfill_document_metadata(
+                doc.document_uuids or [], doc_id=doc.id, user_id=doc.user_id
+            )
+            print(f"Doc {doc.id}: stamped {count} chunks")
+            updated += count
+    return updated
+
+
+if __name__ == "__main__":
+    total = backfill_chunk_metadata()
+    print(f"Backfilled metadata for {total} chunks")
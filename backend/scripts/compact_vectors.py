@@ -0,0 +1,23 @@
+"""Delete Chroma vectors that no document references (failed or partial uploads).
+
+Dry run by default; pass --apply to delete. Run from the backend directory:
+    uv run python -m scripts.compact_vectors [--apply]
+"""
+
+import argparse
+
+from compaction import compact_orphans
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apply", action="store_true", help="delete the orphans")
+    parser.add_argument("--page-size", type=int, default=None)
+    args = parser.parse_args()
+
+    report = compact_orphans(dry_run=not args.apply, page_size=args.page_size)
+    verb = "Deleted" if args.apply else "Would delete"
+    print(
+        f"Scanned {report['scanned']} vectors. {verb} {report['orphans']} orphans; "
+        f"{report['collections']} collection(s) now hold "
+        f"{report['collection_size']} vectors"
+    )
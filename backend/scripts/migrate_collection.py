@@ -0,0 +1,57 @@
+"""Move the serving Chroma collection to another embedding model or HNSW profile.
+
+The current collection keeps serving while a new one is filled in resumable
+batches (vectors are re-embedded only if the model or dimensions change); the
+serving alias then switches to it in one step. Re-run the same command to
+resume an interrupted migration. Run from the backend directory:
+    uv run python -m scripts.migrate_collection --dimensions 1024
+    uv run python -m scripts.migrate_collection --profile recall
+    uv run python -m scripts.migrate_collection --activate citebase_collection  # roll back
+"""
+
+import argparse
+
+from collection_profiles import COLLECTION_PROFILES
+from reembedding import migrate_collection
+from vectorstore import active_collection_name, set_active_collection
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--model",
+        help="embedding model of the new collection (default: the serving one's)",
+    )
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        help="embedding dimensions (default: the serving collection's, or the "
+        "model's full size with --model)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(COLLECTION_PROFILES),
+        help="HNSW profile of the new collection (default: the serving one's)",
+    )
+    parser.add_argument("--target", help="name of the new collection")
+    parser.add_argument("--page-size", type=int, default=None)
+    parser.add_argument(
+        "--no-switch", action="store_true", help="copy only, keep serving the source"
+    )
+    parser.add_argument(
+        "--activate", metavar="COLLECTION", help="only point the alias at COLLECTION"
+    )
+    args = parser.parse_args()
+
+    if args.activate:
+        set_active_collection(args.activate)
+        print(f"Now serving from {active_collection_name()}")
+    else:
+        report = migrate_collection(
+            args.model,
+            args.dimensions,
+            profile=args.profile,
+            target=args.target,
+            page_size=args.page_size,
+            switch=not args.no_switch,
+        )
+        print(report)
@@ -0,0 +1,25 @@
+"""Split the serving Chroma collection into per-user (or per-bucket) vector shards.
+
+Chunks are copied with their embeddings into the shard of the document's
+owner; re-running resumes and copies anything written since. Run it with the
+sharding mode the servers are about to use, while they still run unsharded,
+restart them with VECTOR_SHARDING set, run it again and finally prune:
+    VECTOR_SHARDING=user uv run python -m scripts.split_collection
+    VECTOR_SHARDING=user uv run python -m scripts.split_collection --prune
+"""
+
+import argparse
+
+from reembedding import split_collection
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="delete split chunks from the serving collection",
+    )
+    parser.add_argument("--page-size", type=int, default=None)
+    args = parser.parse_args()
+
+    print(split_collection(page_size=args.page_size, prune=args.prune))
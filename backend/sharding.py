@@ -0,0 +1,66 @@
+import hashlib
+import os
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from db import engine
+from models import VectorShard
+
+# "off" keeps every chunk in one collection; "user" gives each user a
+# collection; "bucket" spreads users over VECTOR_SHARD_BUCKETS collections
+vector_sharding = os.getenv("VECTOR_SHARDING", "off")
+vector_shard_buckets = int(os.getenv("VECTOR_SHARD_BUCKETS", "16"))
+
+if vector_sharding not in ("off", "user", "bucket"):
+    raise ValueError(
+        f"VECTOR_SHARDING must be off, user or bucket, not {vector_sharding!r}"
+    )
+
+
+def sharding_enabled() -> bool:
+    return vector_sharding != "off"
+
+
+def shard_key(user_id: int | None) -> str:
+    """Shard holding a user's chunks ("" when sharding is off)."""
+    if not sharding_enabled() or user_id is None:
+        return ""
+    if vector_sharding == "user":
+        return f"user-{user_id}"
+    digest = hashlib.sha1(str(user_id).encode("utf-8")).hexdigest()
+    return f"bucket-{int(digest, 16) % vector_shard_buckets}"
+
+
+def shard_collection_name(base_collection: str, key: str) -> str:
+    return f"{base_collection}__{key}"
+
+
+def record_shard(base_collection: str, key: str, collection_name: str):
+    with Session(engine) as session:
+        if session.get(VectorShard, collection_name) is not None:
+            return
+        session.add(
+            VectorShard(
+                collection_name=collection_name,
+                base_collection=base_collection,
+                shard_key=key,
+            )
+        )
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another process created the same shard first
+            session.rollback()
+
+
+def list_shards(base_collection: str) -> list[str]:
+    """Keys of the shards created so far for a base collection."""
+    with Session(engine) as session:
+        return list(
+            session.exec(
+                select(VectorShard.shard_key).where(
+                    VectorShard.base_collection == base_collection
+                )
+            ).all()
+        )
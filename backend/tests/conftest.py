@@ -0,0 +1,4 @@
+import os
+
+# db.py refuses to import without a database; tests build their own engines
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,101 @@
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from dedupe import (
+    hand_off_content,
+    link_duplicate,
+    register_content,
+    release_content,
+    retrieval_scope,
+)
+from models import Docs, DocumentContent
+
+
+def make_session() -> Session:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def upload(session: Session, user_id: int, uuids: list[str], content_hash: str):
+    doc = Docs(title="paper", user_id=user_id, document_uuids=uuids)
+    session.add(doc)
+    session.flush()
+    register_content(session, doc, content_hash)
+    session.commit()
+    return doc
+
+
+def version(session: Session, doc: Docs, uuids: list[str], content_hash: str):
+    """Mirror what an ingestion version job does to the rows."""
+    heir = hand_off_content(session, doc)
+    session.commit()
+    doc.document_uuids = uuids
+    release_content(session, doc)
+    register_content(session, doc, content_hash)
+    session.add(doc)
+    session.commit()
+    return heir
+
+
+def test_duplicate_links_to_origin_scope():
+    with make_session() as session:
+        origin = upload(session, 1, ["a", "b", "c"], "hash-v1")
+        duplicate = link_duplicate(session, "hash-v1", "copy", 2)
+        session.commit()
+
+        assert duplicate.document_uuids == ["a", "b", "c"]
+        assert retrieval_scope(session, duplicate) == origin.id
+
+
+def test_duplicate_then_version_the_original():
+    with make_session() as session:
+        origin = upload(session, 1, ["a", "b", "c"], "hash-v1")
+        duplicate = link_duplicate(session, "hash-v1", "copy", 2)
+        session.commit()
+
+        heir = version(session, origin, ["d", "e", "f"], "hash-v2")
+
+        # The shared chunks are now scoped by the duplicate, so the origin's
+        # new chunks (stamped with the origin's id) no longer match its queries
+        assert heir is not None and heir.id == duplicate.id
+        assert retrieval_scope(session, duplicate) == duplicate.id
+        assert retrieval_scope(session, origin) == origin.id
+        shared = session.get(DocumentContent, duplicate.content_id)
+        assert shared.ref_count == 1
+        assert shared.document_uuids == ["a", "b", "c"]
+
+
+def test_version_of_unshared_document_keeps_its_scope():
+    with make_session() as session:
+        doc = upload(session, 1, ["a", "b"], "hash-v1")
+
+        assert version(session, doc, ["a", "c"], "hash-v2") is None
+        assert retrieval_scope(session, doc) == doc.id
+
+
+def test_version_of_duplicate_leaves_origin_scope():
+    with make_session() as session:
+        origin = upload(session, 1, ["a", "b", "c"], "hash-v1")
+        duplicate = link_duplicate(session, "hash-v1", "copy", 2)
+        session.commit()
+
+        assert version(session, duplicate, ["d"], "hash-v2") is None
+        assert retrieval_scope(session, origin) == origin.id
+        assert retrieval_scope(session, duplicate) == duplicate.id
+
+
+def test_concurrent_registration_leaves_loser_unshared(monkeypatch):
+    with make_session() as session:
+        winner = upload(session, 1, ["a", "b"], "hash-v1")
+        # The losing job checked before the winner's row was committed
+        monkeypatch.setattr("dedupe.find_content", lambda *args: None)
+        loser = upload(session, 1, ["c", "d"], "hash-v1")
+
+        assert loser.id is not None and loser.content_id is None
+        assert retrieval_scope(session, loser) == loser.id
+        assert retrieval_scope(session, winner) == winner.id
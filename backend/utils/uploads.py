@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+from fastapi import HTTPException, UploadFile
+
+upload_chunk_bytes = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+max_upload_bytes = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+
+
+async def spool_upload(file: UploadFile, path: str) -> tuple[int, str]:
+    """Stream an upload to `path` in fixed-size chunks.
+
+    Returns the byte size and SHA-256 hex digest computed during the copy.
+    Raises a 413 and removes the partial file once `MAX_UPLOAD_BYTES` is exceeded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as spooled_file:
+            while chunk := await file.read(upload_chunk_bytes):
+                size += len(chunk)
+                if size > max_upload_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {max_upload_bytes} byte upload limit",
+                    )
+                digest.update(chunk)
+                spooled_file.write(chunk)
+    except BaseException:
+        discard_spool(path)
+        raise
+    return size, digest.hexdigest()
+
+
+def discard_spool(path: str):
+    if os.path.exists(path):
+        os.unlink(path)
@@ -1,5 +1,11 @@
+import asyncio
+import hashlib
 import os
-from uuid import uuid4
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
 from urllib.parse import urlparse
 from pathlib import Path
 import chromadb
@@ -7,12 +13,53 @@ from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import StrOutputParser
+from sqlmodel import Session
 
+from chunking import stamp_content_metadata
+from collection_profiles import collection_profile, hnsw_configuration
+from db import engine
+from embedding_cache import (
+    CachedEmbeddings,
+    create_embedding_cache,
+    create_query_embedding_cache,
+    text_hash,
+)
+from exact_search import (
+    ChunkMatrix,
+    ChunkMatrixCache,
+    exact_search_cache_bytes,
+    exact_search_max_chunks,
+)
+from models import CollectionAlias
+from sharding import record_shard, list_shards, shard_collection_name, shard_key
 from utils.file_io import read_markdown_file
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+# Model and dimensions used for newly created collections; each collection
+# records its own in its metadata, and queries are embedded to match it
+embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+# Collections created before the model was recorded in their metadata
+LEGACY_EMBEDDING_MODEL = "text-embedding-3-large"
+
+# Ingestion goes through a persistent content-addressed cache so re-uploaded
+# chunks are not sent to the embedding API again; queries go through a bounded
+# in-process LRU so repeated sub-queries skip the network round trip
+query_embedding_cache = create_query_embedding_cache()
+embedding_cache = create_embedding_cache()
+
+
+@lru_cache(maxsize=None)
+def create_cached_embeddings(
+    model: str, dimensions: int | None = None
+) -> CachedEmbeddings:
+    return CachedEmbeddings(
+        OpenAIEmbeddings(model=model, dimensions=dimensions),
+        embedding_cache,
+        query_cache=query_embedding_cache,
+    )
+
 
 # Get ChromaDB connection details from environment
 chroma_url = os.getenv("CHROMA_SERVER_URL", "http://localhost:1234")
@@ -21,84 +68,641 @@ chroma_host = parsed_url.hostname or "localhost"
 chroma_port = parsed_url.port or 1234
 
 client = chromadb.HttpClient(host=chroma_host, port=chroma_port, ssl=False)
-collection = client.get_or_create_collection("citebase_collection")
+_max_write_batch_size = None
 
-vector_store = Chroma(
-    client=client,
-    collection_name="citebase_collection",
-    embedding_function=embeddings,
+# The serving collection is looked up through an alias row, so a re-embedded
+# collection can replace it in one commit while every process keeps running
+COLLECTION_ALIAS = "citebase"
+DEFAULT_COLLECTION_NAME = "citebase_collection"
+collection_alias_refresh_seconds = float(
+    os.getenv("COLLECTION_ALIAS_REFRESH_SECONDS", "5")
 )
 
 
-def get_documents(ids: list[str]) -> list[Document]:
-    return vector_store.get(ids=ids)
+# The async client is created lazily because it must be awaited inside a running loop
+_async_client = None
+_async_client_lock = asyncio.Lock()
 
 
-def upload_documents(documents: list[Document]):
-    uuids = [str(uuid4()) for _ in range(len(documents))]
-    vector_store.add_documents(documents=documents, ids=uuids)
-    return uuids
+async def get_async_client():
+    global _async_client
+    if _async_client is None:
+        async with _async_client_lock:
+            if _async_client is None:
+                _async_client = await chromadb.AsyncHttpClient(
+                    host=chroma_host, port=chroma_port, ssl=False
+                )
+    return _async_client
 
 
-def delete_documents(ids: list[str]):
-    vector_store.delete_documents(ids=ids)
+class VectorIndex:
+    """A Chroma collection together with the embedding model its vectors come from.
 
+    Built from the sync or the async handle of the collection; the other one
+    is opened on first use.
+    """
 
-def update_documents(documents: list[Document], ids: list[str]):
-    vector_store.update_documents(ids=ids, documents=documents)
+    def __init__(self, collection=None, async_collection=None):
+        source = collection if collection is not None else async_collection
+        self.name = source.name
+        metadata = source.metadata or {}
+        self.embedding_model = metadata.get("embedding_model", LEGACY_EMBEDDING_MODEL)
+        self.embedding_dimensions = metadata.get("embedding_dimensions") or None
+        self.profile = metadata.get("profile", "default")
+        self.embeddings = create_cached_embeddings(
+            self.embedding_model, self.embedding_dimensions
+        )
+        self._collection = collection
+        self._vector_store = None
+        self._lock = threading.Lock()
+        self._async_collection = async_collection
+        self._async_collection_lock = asyncio.Lock()
 
+    @property
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    self._collection = client.get_collection(self.name)
+        return self._collection
 
-def create_rag_chain_for_documents(document_uuids: list[str], top_k: int = 3):
-    """Create a RAG chain that only retrieves from specific document UUIDs."""
+    @property
+    def vector_store(self) -> Chroma:
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    self._vector_store = Chroma(
+                        client=client,
+                        collection_name=self.name,
+                        embedding_function=self.embeddings,
+                    )
+        return self._vector_store
 
-    # Create a custom retriever that works with specific document IDs
-    def custom_retriever(query: str) -> list[Document]:
-        query_embedding = embeddings.embed_query(query)
+    async def get_async_collection(self):
+        if self._async_collection is None:
+            async with self._async_collection_lock:
+                if self._async_collection is None:
+                    async_client = await get_async_client()
+                    self._async_collection = await async_client.get_collection(
+                        self.name
+                    )
+        return self._async_collection
 
-        # Use ChromaDB client directly to query only specific documents
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k, len(document_uuids)),
-            where_document=None,  # No text filter
-            include=["documents", "metadatas", "distances"],
+
+def collection_settings(
+    model: str | None = None,
+    dimensions: int | None = None,
+    profile: str | None = None,
+) -> dict:
+    """`get_or_create_collection` arguments for `model`/`dimensions` and the
+    HNSW settings of `profile` (defaults: EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+    and COLLECTION_PROFILE)."""
+    if model is None:
+        model, dimensions = embedding_model, embedding_dimensions
+    profile = profile or collection_profile
+    return {
+        "configuration": hnsw_configuration(profile),
+        "metadata": {
+            "embedding_model": model,
+            "embedding_dimensions": dimensions or 0,
+            "profile": profile,
+        },
+    }
+
+
+def open_collection(
+    name: str,
+    model: str | None = None,
+    dimensions: int | None = None,
+    profile: str | None = None,
+):
+    """Get a collection, creating it if missing (see `collection_settings`)."""
+    return client.get_or_create_collection(
+        name, **collection_settings(model, dimensions, profile)
+    )
+
+
+def active_collection_name() -> str:
+    with Session(engine) as session:
+        alias = session.get(CollectionAlias, COLLECTION_ALIAS)
+        return alias.collection_name if alias else DEFAULT_COLLECTION_NAME
+
+
+def set_active_collection(name: str):
+    """Point the serving alias at another collection (a single row update)."""
+    client.get_collection(name)  # Raises if the collection does not exist
+    with Session(engine) as session:
+        alias = session.get(CollectionAlias, COLLECTION_ALIAS) or CollectionAlias(
+            alias=COLLECTION_ALIAS, collection_name=name
         )
+        alias.collection_name = name
+        alias.updated_at = datetime.now()
+        session.add(alias)
+        session.commit()
+
+
+_index: VectorIndex | None = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+# Shard collections opened so far, keyed by collection name
+shard_index_cache_size = int(os.getenv("VECTOR_SHARD_CACHE_SIZE", "64"))
+_shard_indexes: OrderedDict[str, VectorIndex] = OrderedDict()
+_shard_indexes_lock = threading.Lock()
+
+
+def get_index(user_id: int | None = None) -> VectorIndex:
+    """The collection holding a user's chunks: their shard when VECTOR_SHARDING
+    is on, otherwise (or without a user) the serving collection."""
+    base = get_base_index()
+    key = shard_key(user_id)
+    if not key:
+        return base
+    return _get_shard_index(base, key)
+
 
-        if not results or "documents" not in results or not results["documents"]:
-            all_docs_result = collection.get(
-                ids=document_uuids, include=["documents", "metadatas"]
+async def aget_index(user_id: int | None = None) -> VectorIndex:
+    """`get_index` for the event loop: the alias lookup runs in a worker thread
+    and new shards are opened with the async Chroma client."""
+    base = _fresh_base_index() or await asyncio.to_thread(get_base_index)
+    key = shard_key(user_id)
+    if not key:
+        return base
+    name = shard_collection_name(base.name, key)
+    index = _cached_shard_index(name)
+    if index is None:
+        async_client = await get_async_client()
+        index = VectorIndex(
+            async_collection=await async_client.get_or_create_collection(
+                name,
+                **collection_settings(
+                    base.embedding_model, base.embedding_dimensions, base.profile
+                ),
             )
-            if all_docs_result and "documents" in all_docs_result:
-                docs = []
-                for i, doc_text in enumerate(all_docs_result["documents"][:top_k]):
-                    metadata = (
-                        all_docs_result["metadatas"][i]
-                        if "metadatas" in all_docs_result
-                        and i < len(all_docs_result["metadatas"])
-                        else {}
-                    )
-                    docs.append(Document(page_content=doc_text, metadata=metadata))
-                return docs
+        )
+        await asyncio.to_thread(record_shard, base.name, key, name)
+        _cache_shard_index(name, index)
+    return index
+
+
+def _get_shard_index(base: VectorIndex, key: str) -> VectorIndex:
+    name = shard_collection_name(base.name, key)
+    index = _cached_shard_index(name)
+    if index is not None:
+        return index
+
+    # Shards are created on first use with the base collection's model and profile
+    index = VectorIndex(
+        open_collection(
+            name, base.embedding_model, base.embedding_dimensions, base.profile
+        )
+    )
+    record_shard(base.name, key, name)
+    _cache_shard_index(name, index)
+    return index
+
+
+def _cached_shard_index(name: str) -> VectorIndex | None:
+    with _shard_indexes_lock:
+        index = _shard_indexes.get(name)
+        if index is not None:
+            _shard_indexes.move_to_end(name)
+        return index
+
+
+def _cache_shard_index(name: str, index: VectorIndex):
+    with _shard_indexes_lock:
+        _shard_indexes[name] = index
+        _shard_indexes.move_to_end(name)
+        while len(_shard_indexes) > shard_index_cache_size:
+            _shard_indexes.popitem(last=False)
+
+
+def all_indexes() -> list[VectorIndex]:
+    """The serving collection followed by every shard created from it."""
+    base = get_base_index()
+    return [base] + [_get_shard_index(base, key) for key in list_shards(base.name)]
+
+
+def get_base_index() -> VectorIndex:
+    """The collection currently serving reads and writes, re-checked every few seconds."""
+    global _index, _index_checked_at
+    index = _fresh_base_index()
+    if index is not None:
+        return index
+    with _index_lock:
+        if (
+            _index is None
+            or time.monotonic() - _index_checked_at >= collection_alias_refresh_seconds
+        ):
+            name = active_collection_name()
+            if _index is None or _index.name != name:
+                _index = VectorIndex(open_collection(name))
+            _index_checked_at = time.monotonic()
+    return _index
+
+
+def _fresh_base_index() -> VectorIndex | None:
+    """The serving collection if its alias was checked recently, else None."""
+    if (
+        _index is not None
+        and time.monotonic() - _index_checked_at < collection_alias_refresh_seconds
+    ):
+        return _index
+    return None
+
+
+# Embedding matrices of small documents, searched in-process
+chunk_matrices = ChunkMatrixCache(exact_search_cache_bytes)
+CHUNK_MATRIX_INCLUDE = ["embeddings", "documents", "metadatas"]
+
+# Cap on concurrent synthesis calls when a RAG chain answers a batch of queries
+rag_batch_max_concurrency = int(os.getenv("RAG_BATCH_MAX_CONCURRENCY", "8"))
+
+# Compiled RAG chains keyed by (doc_id, document_uuids version, top_k, shard)
+rag_chain_cache_size = int(os.getenv("RAG_CHAIN_CACHE_SIZE", "128"))
+_rag_chain_cache: OrderedDict[tuple, "DocumentRAGChain"] = OrderedDict()
+_rag_chain_cache_lock = threading.Lock()
+
+
+def get_documents(ids: list[str], user_id: int | None = None) -> list[Document]:
+    return get_index(user_id).vector_store.get(ids=ids)
+
+
+def get_max_write_batch_size() -> int:
+    """Largest batch the Chroma server accepts in a single add/upsert."""
+    global _max_write_batch_size
+    if _max_write_batch_size is None:
+        _max_write_batch_size = client.get_max_batch_size()
+    return _max_write_batch_size
+
+
+def write_embedded_documents(
+    documents: list[Document],
+    document_embeddings: list[list[float]],
+    ids: list[str],
+    doc_id: int | None = None,
+    user_id: int | None = None,
+    index: VectorIndex | None = None,
+):
+    """Write chunks whose embeddings were computed ahead of time (upserts by id)."""
+    _stamp_ownership(documents, doc_id, user_id)
+    (index or get_index(user_id)).collection.upsert(
+        ids=ids,
+        embeddings=document_embeddings,
+        documents=[doc.page_content for doc in documents],
+        metadatas=[doc.metadata or None for doc in documents],
+    )
+    return ids
+
+
+def _stamp_ownership(
+    documents: list[Document], doc_id: int | None, user_id: int | None
+):
+    # Stamp ownership into chunk metadata so retrieval can filter server-side
+    for doc in documents:
+        if doc_id is not None:
+            doc.metadata["doc_id"] = doc_id
+        if user_id is not None:
+            doc.metadata["user_id"] = user_id
+
+
+def delete_documents(ids: list[str], user_id: int | None = None):
+    get_index(user_id).vector_store.delete(ids=ids)
+
+
+def update_documents(
+    documents: list[Document], ids: list[str], user_id: int | None = None
+):
+    # Chroma merges metadata, so stale text-derived fields would otherwise stay
+    for document in documents:
+        stamp_content_metadata(document)
+    get_index(user_id).vector_store.update_documents(ids=ids, documents=documents)
+
+
+def backfill_document_metadata(
+    ids: list[str], doc_id: int, user_id: int | None = None
+) -> int:
+    """Stamp doc_id/user_id into the metadata of stored chunks (chunks uploaded
+    before scoping, or shared chunks handed to another document)."""
+    if not ids:
+        return 0
+
+    collection = get_index(user_id).collection
+    stamped = 0
+    for start in range(0, len(ids), get_max_write_batch_size()):
+        existing = collection.get(
+            ids=ids[start : start + get_max_write_batch_size()], include=["metadatas"]
+        )
+        found_ids = existing.get("ids") or []
+        if not found_ids:
+            continue
+
+        metadatas = []
+        for metadata in existing.get("metadatas") or [None] * len(found_ids):
+            metadata = dict(metadata or {})
+            metadata["doc_id"] = doc_id
+            if user_id is not None:
+                metadata["user_id"] = user_id
+            metadatas.append(metadata)
+
+        collection.update(ids=found_ids, metadatas=metadatas)
+        stamped += len(found_ids)
+    return stamped
+
+
+def get_chunk_hashes(
+    ids: list[str], user_id: int | None = None, page_size: int = 1000
+) -> dict[str, str]:
+    """Map stored chunk ids to the hash of their text.
+
+    Chunks written before `content_hash` was recorded are hashed from their text.
+    """
+    collection = get_index(user_id).collection
+    hashes = {}
+    for start in range(0, len(ids), page_size):
+        results = collection.get(
+            ids=ids[start : start + page_size], include=["documents", "metadatas"]
+        )
+        for chunk_id, text, metadata in zip(
+            results["ids"], results["documents"], results["metadatas"]
+        ):
+            hashes[chunk_id] = (metadata or {}).get("content_hash") or text_hash(text)
+    return hashes
+
+
+def update_chunk_metadata(
+    documents: list[Document],
+    ids: list[str],
+    doc_id: int | None = None,
+    user_id: int | None = None,
+):
+    """Rewrite the metadata of stored chunks without re-embedding them."""
+    if not ids:
+        return
+    _stamp_ownership(documents, doc_id, user_id)
+    collection = get_index(user_id).collection
+    for start in range(0, len(ids), get_max_write_batch_size()):
+        end = start + get_max_write_batch_size()
+        collection.update(
+            ids=ids[start:end],
+            metadatas=[doc.metadata or None for doc in documents[start:end]],
+        )
+
+
+def format_docs(docs: list[Document]) -> str:
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+def chunk_record(chunk_id: str, doc: Document, distance: float | None) -> dict:
+    """A retrieved chunk with its id, source/page and distance (in the
+    collection's space; cosine for in-process exact search)."""
+    metadata = doc.metadata or {}
+    source = metadata.get("source")
+    page = metadata.get("page")
+    return {
+        "source_id": chunk_id,
+        "source": os.path.basename(source) if source else None,
+        "page": page + 1 if isinstance(page, int) else None,
+        "chunk_index": metadata.get("chunk_index"),
+        "distance": round(distance, 4) if distance is not None else None,
+        "content": doc.page_content,
+    }
+
+
+class DocumentRAGChain(Runnable[dict, str]):
+    """RAG chain that only retrieves from specific document UUIDs.
+
+    Documents of up to EXACT_SEARCH_MAX_CHUNKS chunks are searched exactly in
+    process against their cached embedding matrix; larger ones are queried in
+    Chroma. `batch`/`abatch` retrieve for every question with one embedding
+    request and one search, then synthesize the answers concurrently.
+    """
+
+    def __init__(
+        self,
+        document_uuids: list[str],
+        top_k: int,
+        doc_id: int | None,
+        answer_chain: Runnable,
+        user_id: int | None = None,
+    ):
+        self.document_uuids = document_uuids
+        self.top_k = top_k
+        self.doc_id = doc_id
+        self.answer_chain = answer_chain
+        self.user_id = user_id
+
+    def retrieve(self, query: str) -> list[Document]:
+        return self.retrieve_many([query])[0]
+
+    def retrieve_many(self, queries: list[str]) -> list[list[Document]]:
+        return [[doc for _, doc, _ in hits] for hits in self.search_many(queries)]
+
+    async def aretrieve_many(self, queries: list[str]) -> list[list[Document]]:
+        hits = await self.asearch_many(queries)
+        return [[doc for _, doc, _ in row] for row in hits]
+
+    def search_many(self, queries: list[str]) -> list[list[tuple]]:
+        """(chunk id, chunk, distance) of the top-k chunks for each query."""
+        if not queries:
+            return []
+        # Queries must be embedded by the model of the collection they search
+        index = get_index(self.user_id)
+        query_embeddings = index.embeddings.embed_queries(queries)
+        if self.uses_exact_search:
+            chunk_matrix = self._load_chunk_matrix(index)
+            return chunk_matrix.search_with_distances(query_embeddings, self.top_k)
+
+        # Use ChromaDB client directly to query only specific documents
+        results = index.collection.query(**self._query_kwargs(query_embeddings))
+
+        retrieved = [
+            self._hits_from_results(results, row) for row in range(len(queries))
+        ]
+        if not all(retrieved):
+            # Chunks not stamped with doc_id yet: search them exactly instead
+            chunk_matrix = self._load_chunk_matrix(index)
+            exact = chunk_matrix.search_with_distances(query_embeddings, self.top_k)
+            retrieved = [hits or fallback for hits, fallback in zip(retrieved, exact)]
+        return retrieved
+
+    async def aembed_queries(self, queries: list[str]) -> list[list[float]]:
+        """Embed queries with the model of the collection this chain searches."""
+        return await (await aget_index(self.user_id)).embeddings.aembed_queries(queries)
+
+    async def asearch_many(
+        self,
+        queries: list[str],
+        query_embeddings: list[list[float]] | None = None,
+    ) -> list[list[tuple]]:
+        """Async `search_many`; pass `query_embeddings` from `aembed_queries`
+        to reuse them."""
+        if not queries:
             return []
+        index = await aget_index(self.user_id)
+        if query_embeddings is None:
+            query_embeddings = await index.embeddings.aembed_queries(queries)
+        if self.uses_exact_search:
+            chunk_matrix = await self._aload_chunk_matrix(index)
+            return chunk_matrix.search_with_distances(query_embeddings, self.top_k)
 
-        docs = []
-        for i, doc_text in enumerate(results["documents"][0]):
+        async_collection = await index.get_async_collection()
+        results = await async_collection.query(**self._query_kwargs(query_embeddings))
+
+        retrieved = [
+            self._hits_from_results(results, row) for row in range(len(queries))
+        ]
+        if not all(retrieved):
+            chunk_matrix = await self._aload_chunk_matrix(index)
+            exact = chunk_matrix.search_with_distances(query_embeddings, self.top_k)
+            retrieved = [hits or fallback for hits, fallback in zip(retrieved, exact)]
+        return retrieved
+
+    @property
+    def uses_exact_search(self) -> bool:
+        return len(self.document_uuids) <= exact_search_max_chunks
+
+    def _load_chunk_matrix(self, index: VectorIndex) -> ChunkMatrix:
+        chunk_matrix = chunk_matrices.get(self.document_uuids, index.name)
+        if chunk_matrix is None:
+            chunk_matrix = ChunkMatrix.from_results(
+                index.collection.get(
+                    ids=self.document_uuids, include=CHUNK_MATRIX_INCLUDE
+                )
+            )
+            chunk_matrices.put(self.document_uuids, chunk_matrix, index.name)
+        return chunk_matrix
+
+    async def _aload_chunk_matrix(self, index: VectorIndex) -> ChunkMatrix:
+        chunk_matrix = chunk_matrices.get(self.document_uuids, index.name)
+        if chunk_matrix is None:
+            async_collection = await index.get_async_collection()
+            chunk_matrix = ChunkMatrix.from_results(
+                await async_collection.get(
+                    ids=self.document_uuids, include=CHUNK_MATRIX_INCLUDE
+                )
+            )
+            chunk_matrices.put(self.document_uuids, chunk_matrix, index.name)
+        return chunk_matrix
+
+    def _query_kwargs(self, query_embeddings: list[list[float]]) -> dict:
+        return {
+            "query_embeddings": query_embeddings,
+            "n_results": min(self.top_k, len(self.document_uuids)),
+            "where": {"doc_id": self.doc_id} if self.doc_id is not None else None,
+            "where_document": None,  # No text filter
+            "include": ["documents", "metadatas", "distances"],
+        }
+
+    def _hits_from_results(self, results, row: int) -> list[tuple]:
+        if not results or not results.get("documents"):
+            return []
+
+        hits = []
+        for i, doc_text in enumerate(results["documents"][row]):
             metadata = (
-                results["metadatas"][0][i]
-                if "metadatas" in results
-                and results["metadatas"]
-                and i < len(results["metadatas"][0])
+                results["metadatas"][row][i]
+                if results.get("metadatas") and i < len(results["metadatas"][row])
                 else {}
             )
             # Filter to only include our target document UUIDs
-            doc_id = (
-                results["ids"][0][i]
-                if "ids" in results and results["ids"] and i < len(results["ids"][0])
+            chunk_id = (
+                results["ids"][row][i]
+                if results.get("ids") and i < len(results["ids"][row])
                 else None
             )
-            if doc_id in document_uuids:
-                docs.append(Document(page_content=doc_text, metadata=metadata))
+            distance = (
+                results["distances"][row][i] if results.get("distances") else None
+            )
+            if chunk_id in self.document_uuids:
+                hits.append(
+                    (
+                        chunk_id,
+                        Document(page_content=doc_text, metadata=metadata),
+                        distance,
+                    )
+                )
+
+        return hits[: self.top_k]
+
+    def _answer_inputs(self, inputs: list[dict], contexts) -> list[dict]:
+        return [
+            {"context": format_docs(docs), "question": x["question"]}
+            for x, docs in zip(inputs, contexts)
+        ]
+
+    def invoke(self, input: dict, config=None, **kwargs) -> str:
+        contexts = self.retrieve_many([input["question"]])
+        return self.answer_chain.invoke(
+            self._answer_inputs([input], contexts)[0], config
+        )
+
+    async def ainvoke(self, input: dict, config=None, **kwargs) -> str:
+        contexts = await self.aretrieve_many([input["question"]])
+        return await self.answer_chain.ainvoke(
+            self._answer_inputs([input], contexts)[0], config
+        )
+
+    def batch(self, inputs: list[dict], config=None, **kwargs) -> list[str]:
+        if not inputs:
+            return []
+        contexts = self.retrieve_many([x["question"] for x in inputs])
+        return self.answer_chain.batch(
+            self._answer_inputs(inputs, contexts),
+            _with_max_concurrency(config),
+            **kwargs,
+        )
+
+    async def abatch(self, inputs: list[dict], config=None, **kwargs) -> list[str]:
+        if not inputs:
+            return []
+        contexts = await self.aretrieve_many([x["question"] for x in inputs])
+        return await self.answer_chain.abatch(
+            self._answer_inputs(inputs, contexts),
+            _with_max_concurrency(config),
+            **kwargs,
+        )
+
+    async def aanswer_many(
+        self,
+        questions: list[str],
+        config=None,
+        contexts: list[list[Document]] | None = None,
+    ) -> list[tuple[list[Document], str]]:
+        """Answer every question concurrently, keeping the chunks each answer
+        used; `contexts` skips retrieval when the chunks are already known."""
+        if not questions:
+            return []
+        if contexts is None:
+            contexts = await self.aretrieve_many(questions)
+        answers = await self.answer_chain.abatch(
+            self._answer_inputs([{"question": q} for q in questions], contexts),
+            _with_max_concurrency(config),
+        )
+        return list(zip(contexts, answers))
+
+
+def _with_max_concurrency(config):
+    if isinstance(config, list):
+        return config
+    config = dict(config or {})
+    config.setdefault("max_concurrency", rag_batch_max_concurrency)
+    return config
+
+
+def create_rag_chain_for_documents(
+    document_uuids: list[str],
+    top_k: int = 3,
+    doc_id: int | None = None,
+    user_id: int | None = None,
+):
+    """Create a RAG chain that only retrieves from specific document UUIDs.
 
-        return docs[:top_k]
+    When `doc_id` is given the query is scoped server-side with a metadata
+    `where` filter, so its cost does not depend on the size of the collection.
+    `user_id` is the owner of the chunks and selects their shard.
+    """
 
     # Load the prompt template
     try:
@@ -120,18 +724,49 @@ Answer:"""
     # Create LLM
     llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
 
-    # Create RAG chain
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    answer_chain = prompt | llm | StrOutputParser()
 
-    rag_chain = (
-        {
-            "context": lambda x: format_docs(custom_retriever(x["question"])),
-            "question": lambda x: x["question"],
-        }
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
+    return DocumentRAGChain(document_uuids, top_k, doc_id, answer_chain, user_id)
+
+
+def documents_version(document_uuids: list[str]) -> str:
+    return hashlib.sha1("\n".join(document_uuids).encode("utf-8")).hexdigest()
 
+
+def get_rag_chain_for_documents(
+    document_uuids: list[str],
+    top_k: int = 3,
+    doc_id: int | None = None,
+    user_id: int | None = None,
+) -> DocumentRAGChain:
+    """Return a warm RAG chain for the document set, building it on a cache miss."""
+    key = (doc_id, documents_version(document_uuids), top_k, shard_key(user_id))
+    with _rag_chain_cache_lock:
+        rag_chain = _rag_chain_cache.get(key)
+        if rag_chain is not None:
+            _rag_chain_cache.move_to_end(key)
+            return rag_chain
+
+    rag_chain = create_rag_chain_for_documents(document_uuids, top_k, doc_id, user_id)
+    with _rag_chain_cache_lock:
+        _rag_chain_cache[key] = rag_chain
+        _rag_chain_cache.move_to_end(key)
+        while len(_rag_chain_cache) > rag_chain_cache_size:
+            _rag_chain_cache.popitem(last=False)
     return rag_chain
+
+
+def invalidate_rag_chains(ids: list[str] | None = None, doc_id: int | None = None):
+    """Drop cached chains (and chunk matrices) for a document or for any chain
+    containing the given chunk ids."""
+    ids = set(ids or [])
+    stale_ids = set(ids)
+    with _rag_chain_cache_lock:
+        for key, rag_chain in list(_rag_chain_cache.items()):
+            if (doc_id is not None and rag_chain.doc_id == doc_id) or ids.intersection(
+                rag_chain.document_uuids
+            ):
+                stale_ids.update(rag_chain.document_uuids)
+                del _rag_chain_cache[key]
+    if stale_ids:
+        chunk_matrices.invalidate(list(stale_ids))
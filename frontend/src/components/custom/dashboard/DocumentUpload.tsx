@@ -42,6 +42,10 @@ const documentSchema = z.object({
 
 type DocumentFormValues = z.infer<typeof documentSchema>;
 
+const JOB_POLL_INTERVAL_MS = 1000;
+// Give up polling after this long; the job keeps running on the server
+const JOB_MAX_WAIT_MS = 10 * 60 * 1000;
+
 interface DocumentUploadProps {
   onUploadSuccess?: () => void;
 }
@@ -80,16 +84,59 @@ const DocumentUpload = ({ onUploadSuccess }: DocumentUploadProps) => {
         });
 
         const data = await response.json();
-        setUploadData(data);
 
-        if (response.ok) {
-          console.log("Document uploaded successfully:", data);
+        if (response.ok && data.job_id) {
+          // Ingestion runs in the background; poll the job until it finishes
+          let job = data;
+          const deadline = Date.now() + JOB_MAX_WAIT_MS;
+          while (job.stage !== "completed" && job.stage !== "failed") {
+            if (Date.now() > deadline) {
+              form.setError("document", {
+                message:
+                  "Processing is taking longer than expected; check your documents later",
+              });
+              return;
+            }
+            await new Promise((resolve) =>
+              setTimeout(resolve, JOB_POLL_INTERVAL_MS),
+            );
+            const jobResponse = await fetch(
+              `http://localhost:8000/documents/jobs/${data.job_id}`,
+              { headers },
+            );
+            const jobData = await jobResponse.json().catch(() => ({}));
+            if (!jobResponse.ok) {
+              form.setError("document", {
+                message:
+                  jobData.detail ||
+                  jobData.message ||
+                  `Failed to check upload status (${jobResponse.status})`,
+              });
+              return;
+            }
+            job = jobData;
+          }
+
+          if (job.stage === "failed") {
+            form.setError("document", {
+              message: job.error || "Failed to upload document",
+            });
+            return;
+          }
+
+          setUploadData({
+            id: job.document_id,
+            title: job.title,
+            chunk_ids: [],
+            chunk_count: job.chunk_count,
+          });
+          console.log("Document uploaded successfully:", job);
           form.reset();
           if (fileInputRef.current) {
             fileInputRef.current.value = "";
           }
           // You can add a toast notification here for better UX
-          alert(`Successfully uploaded ${data.chunk_count} document chunk(s)`);
+          alert(`Successfully uploaded ${job.chunk_count} document chunk(s)`);
         } else {
           form.setError("document", {
             message: data.message || "Failed to upload document",